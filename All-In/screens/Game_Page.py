@@ -445,6 +445,10 @@ class GamePage(Screen):
         self.next_question()
         switch_screen(instance, self.manager, "start_page")
 
+    def on_leave(self, *args) -> None:
+        """Stop scripts started with zingo_engine.run_async so their callbacks don't land off-screen."""
+        self.zingo_engine.cancel_all()
+
     def continue_after_roulette(self) -> None:
         """Called by roulette page to continue the game flow."""
         self.next_question()
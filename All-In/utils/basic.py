@@ -7,6 +7,16 @@ from utils.string_with_arrows import *
 import string
 import os
 import math
+import pickle
+import hashlib
+import threading
+import time
+import sys
+
+try:
+  import resource
+except ImportError:
+  resource = None
 
 #######################################
 # CONSTANTS
@@ -1305,6 +1315,126 @@ class RTResult:
       self.loop_should_break
     )
 
+#######################################
+# RUN STATE
+#######################################
+
+# Per-thread state of the run in progress: meter is the BudgetMeter the
+# interpreter charges steps to.
+class RunState(threading.local):
+  meter = None
+
+run_state = RunState()
+
+# Limits on how much work a run may do. A step is a loop iteration or a
+# function call, which every long-running script has to go through; the
+# clock and memory use are only sampled once every check_interval steps.
+# max_depth limits how deeply function calls may nest, so runaway recursion
+# stops with an error at the call instead of exhausting Python's stack.
+# max_memory is process-wide: it limits the growth of the whole process's
+# resident memory since the run started, so memory allocated by other
+# threads in the meantime counts against the script too. It is a coarse
+# safety net for runs that have the process to themselves and is off
+# unless asked for.
+class Budget:
+  def __init__(self, max_steps=None, max_seconds=None, max_memory=None, max_depth=None, check_interval=256):
+    self.max_steps = max_steps
+    self.max_seconds = max_seconds
+    self.max_memory = max_memory
+    self.max_depth = max_depth
+    self.check_interval = check_interval
+
+  def start(self):
+    return BudgetMeter(self)
+
+class BudgetMeter:
+  def __init__(self, budget):
+    self.budget = budget
+    self.cancelled = False
+    self.start()
+
+  # A meter can be passed to a run in place of its Budget, so whoever holds
+  # it can cancel() the run from another thread
+  def start(self):
+    budget = self.budget
+    self.steps = 0
+    self.depth = 0
+    self.deadline = None
+    self.memory_base = None
+
+    if budget.max_seconds is not None:
+      self.deadline = time.monotonic() + budget.max_seconds
+    if budget.max_memory is not None:
+      self.memory_base = memory_usage()
+
+    self.batch = self.countdown = self.next_batch()
+    return self
+
+  # Takes effect at the next check, within check_interval steps
+  def cancel(self):
+    self.cancelled = True
+
+  # Returns an RTError once the budget is used up
+  def step(self, pos_start, pos_end, context):
+    self.countdown -= 1
+    if self.countdown: return None
+    return self.check(pos_start, pos_end, context)
+
+  def check(self, pos_start, pos_end, context):
+    budget = self.budget
+    self.steps += self.batch
+
+    if self.cancelled:
+      details = 'Script was cancelled'
+    elif budget.max_steps is not None and self.steps > budget.max_steps:
+      details = f'Step budget of {budget.max_steps} exceeded'
+    elif self.deadline is not None and time.monotonic() > self.deadline:
+      details = f'Time budget of {budget.max_seconds}s exceeded'
+    elif self.memory_base is not None and memory_usage() - self.memory_base > budget.max_memory:
+      details = f'Memory budget of {budget.max_memory} bytes exceeded'
+    else:
+      self.batch = self.countdown = self.next_batch()
+      return None
+
+    return RTError(pos_start, pos_end, details, context)
+
+  # Called on entering a function; the caller lowers depth again on leaving
+  def enter(self, pos_start, pos_end, context):
+    max_depth = self.budget.max_depth
+    if max_depth is not None and self.depth >= max_depth:
+      return RTError(pos_start, pos_end, f'Call depth limit of {max_depth} exceeded', context)
+    self.depth += 1
+    return None
+
+  def next_batch(self):
+    batch = self.budget.check_interval
+    if self.budget.max_steps is not None:
+      batch = min(batch, self.budget.max_steps - self.steps + 1)
+    return max(batch, 1)
+
+# The resident memory of the process in bytes. Only Linux reports the current
+# value cheaply, elsewhere the peak is used.
+def memory_usage():
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, AttributeError):
+    pass
+
+  if resource is None:
+    return 0
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+# Makes budget the limit for the runs started on this thread until the
+# returned meter is restored. Without a budget the current meter is kept, so
+# a script run from inside another stays within the outer limits.
+def start_budget(budget):
+  previous = run_state.meter
+  if budget is not None:
+    run_state.meter = budget.start()
+  return previous
+
 #######################################
 # VALUES
 #######################################
@@ -1636,6 +1766,22 @@ class Function(BaseFunction):
     self.should_auto_return = should_auto_return
 
   def execute(self, args):
+    meter = run_state.meter
+    if meter is None:
+      return self.call(args)
+
+    error = (
+      meter.step(self.pos_start, self.pos_end, self.context) or
+      meter.enter(self.pos_start, self.pos_end, self.context)
+    )
+    if error: return RTResult().failure(error)
+
+    try:
+      return self.call(args)
+    finally:
+      meter.depth -= 1
+
+  def call(self, args):
     res = RTResult()
     interpreter = Interpreter()
     exec_ctx = self.generate_new_context()
@@ -1835,8 +1981,7 @@ class BuiltInFunction(BaseFunction):
 
 
       try:
-          with open(fn, "r") as f:
-              script = f.read()
+          node, error = load_program(fn)
       except Exception as e:
           return res.failure(RTError(
               self.pos_start, self.pos_end,
@@ -1844,10 +1989,13 @@ class BuiltInFunction(BaseFunction):
               exec_ctx
           ))
 
+      # Every script gets a global scope of its own, so nothing it defines
+      # outlives the run
       new_context = Context(fn, exec_ctx.parent, self.pos_start)
-      new_context.symbol_table = global_symbol_table
+      new_context.symbol_table = new_global_scope()
 
-      _, error = run(fn, script, new_context)
+      if not error:
+          _, error = run_program(node, new_context)
         
         
       if error:
@@ -1909,6 +2057,22 @@ class SymbolTable:
   def remove(self, name):
     del self.symbols[name]
 
+# Builtins are shared by every program, so once populated this table is frozen
+# and assignments land in a per-run SymbolTable layered on top of it.
+class BuiltinSymbolTable(SymbolTable):
+  frozen = False
+
+  def freeze(self):
+    self.frozen = True
+
+  def set(self, name, value):
+    if self.frozen:
+      raise Exception(f"Builtin '{name}' can't be rebound")
+    super().set(name, value)
+
+  def remove(self, name):
+    raise Exception(f"Builtin '{name}' can't be removed")
+
 #######################################
 # INTERPRETER
 #######################################
@@ -2068,8 +2232,14 @@ class Interpreter:
       condition = lambda: i < end_value.value
     else:
       condition = lambda: i > end_value.value
+
+    meter = run_state.meter
     
     while condition():
+      if meter is not None:
+        error = meter.step(node.pos_start, node.pos_end, context)
+        if error: return res.failure(error)
+
       context.symbol_table.set(node.var_name_tok.value, Number(i))
       i += step_value.value
 
@@ -2092,8 +2262,13 @@ class Interpreter:
   def visit_WhileNode(self, node, context):
     res = RTResult()
     elements = []
+    meter = run_state.meter
 
     while True:
+      if meter is not None:
+        error = meter.step(node.pos_start, node.pos_end, context)
+        if error: return res.failure(error)
+
       condition = res.register(self.visit(node.condition_node, context))
       if res.should_return(): return res
 
@@ -2167,40 +2342,57 @@ class Interpreter:
 # RUN
 #######################################
 
-global_symbol_table = SymbolTable()
-global_symbol_table.set("NULL", Number.null)
-global_symbol_table.set("FALSE", Number.false)
-global_symbol_table.set("TRUE", Number.true)
-global_symbol_table.set("MATH_PI", Number.math_PI)
-global_symbol_table.set("TYPESHI", BuiltInFunction.print)
-global_symbol_table.set("TYPESHI_RET", BuiltInFunction.print_ret)
-global_symbol_table.set("INPUT", BuiltInFunction.input)
-global_symbol_table.set("INPUT_INT", BuiltInFunction.input_int)
-global_symbol_table.set("CLEAR", BuiltInFunction.clear)
-global_symbol_table.set("CLS", BuiltInFunction.clear)
-global_symbol_table.set("IS_NUM", BuiltInFunction.is_number)
-global_symbol_table.set("IS_STR", BuiltInFunction.is_string)
-global_symbol_table.set("IS_LIST", BuiltInFunction.is_list)
-global_symbol_table.set("IS_FUN", BuiltInFunction.is_function)
-global_symbol_table.set("APPEND", BuiltInFunction.append)
-global_symbol_table.set("POP", BuiltInFunction.pop)
-global_symbol_table.set("EXTEND", BuiltInFunction.extend)
-global_symbol_table.set("LEN", BuiltInFunction.len)
-global_symbol_table.set("RUN", BuiltInFunction.run)
+builtin_symbol_table = BuiltinSymbolTable()
+builtin_symbol_table.set("NULL", Number.null)
+builtin_symbol_table.set("FALSE", Number.false)
+builtin_symbol_table.set("TRUE", Number.true)
+builtin_symbol_table.set("MATH_PI", Number.math_PI)
+builtin_symbol_table.set("TYPESHI", BuiltInFunction.print)
+builtin_symbol_table.set("TYPESHI_RET", BuiltInFunction.print_ret)
+builtin_symbol_table.set("INPUT", BuiltInFunction.input)
+builtin_symbol_table.set("INPUT_INT", BuiltInFunction.input_int)
+builtin_symbol_table.set("CLEAR", BuiltInFunction.clear)
+builtin_symbol_table.set("CLS", BuiltInFunction.clear)
+builtin_symbol_table.set("IS_NUM", BuiltInFunction.is_number)
+builtin_symbol_table.set("IS_STR", BuiltInFunction.is_string)
+builtin_symbol_table.set("IS_LIST", BuiltInFunction.is_list)
+builtin_symbol_table.set("IS_FUN", BuiltInFunction.is_function)
+builtin_symbol_table.set("APPEND", BuiltInFunction.append)
+builtin_symbol_table.set("POP", BuiltInFunction.pop)
+builtin_symbol_table.set("EXTEND", BuiltInFunction.extend)
+builtin_symbol_table.set("LEN", BuiltInFunction.len)
+builtin_symbol_table.set("RUN", BuiltInFunction.run)
+builtin_symbol_table.freeze()
+
+# A fresh global scope for one run. The builtins are not copied into it, so
+# an isolated run costs no more to set up than a shared one.
+def new_global_scope():
+    return SymbolTable(builtin_symbol_table)
 
 # In basic.py, update the function signature and context setup
 
-def run(fn, text, parent_context=None): # New optional argument
+def parse(fn, text):
     lexer = Lexer(fn, text)
     tokens, error = lexer.make_tokens()
     if error:
         return None, error
 
+    # Nesting that is too deep for Python's stack is a syntax error too
     parser = Parser(tokens)
-    ast = parser.parse()
+    try:
+        ast = parser.parse()
+    except RecursionError:
+        return None, InvalidSyntaxError(
+            tokens[0].pos_start, tokens[-1].pos_end,
+            'Expression is nested too deeply'
+        )
     if ast.error:
         return None, ast.error
 
+    return ast.node, None
+
+# budget optionally limits the steps, time and memory the run may use.
+def run_program(node, parent_context=None, budget=None):
     interpreter = Interpreter()
 
     # Use parent_context if provided (for bridge_test), otherwise create a new one
@@ -2208,9 +2400,21 @@ def run(fn, text, parent_context=None): # New optional argument
         context = parent_context
     else:
         context = Context('<program>')
-        context.symbol_table = global_symbol_table
+        context.symbol_table = new_global_scope()
 
-    result = interpreter.visit(ast.node, context)
+    # Nesting or recursion deeper than Python's stack allows ends the run
+    # with an error instead of escaping to the caller
+    previous_meter = start_budget(budget)
+    try:
+        result = interpreter.visit(node, context)
+    except RecursionError:
+        result = RTResult().failure(RTError(
+            node.pos_start, node.pos_end,
+            'Maximum recursion depth exceeded',
+            context
+        ))
+    finally:
+        run_state.meter = previous_meter
 
     # Use the robust return logic (as previously recommended)
     if result.func_return_value is not None:
@@ -2218,4 +2422,133 @@ def run(fn, text, parent_context=None): # New optional argument
     else:
         value = result.value
 
-    return value, result.error
\ No newline at end of file
+    return value, result.error
+
+def run(fn, text, parent_context=None, budget=None): # New optional argument
+    node, error = parse(fn, text)
+    if error:
+        return None, error
+
+    return run_program(node, parent_context, budget)
+
+# Runs a script from disk, reusing its cached AST when it is still fresh.
+# fn is the name shown in errors and defaults to the path.
+def run_file(path, parent_context=None, fn=None, budget=None):
+    node, error = load_program(path, fn)
+    if error:
+        return None, error
+
+    return run_program(node, parent_context, budget)
+
+# Converts a Python value to the Zingo value a script sees. Values that are
+# already Zingo values pass through, and bools become the numbers 1 and 0.
+def to_value(value):
+    if isinstance(value, Value):
+        return value
+    if isinstance(value, bool):
+        return Number(int(value))
+    if isinstance(value, (int, float)):
+        return Number(value)
+    if isinstance(value, str):
+        return String(value)
+    if isinstance(value, (list, tuple)):
+        return List([to_value(element) for element in value])
+    raise TypeError(f"Can't convert {type(value).__name__} to a Zingo value")
+
+#######################################
+# PROGRAM CACHE
+#######################################
+
+# Parsed programs are pickled much like .pyc files, but into a cache
+# directory of the current user: $ZINGO_CACHE_DIR, else $XDG_CACHE_HOME/zingo,
+# else ~/.cache/zingo. Unpickling can run arbitrary code, so entries are never
+# read from next to a script, where whoever ships the script could plant one,
+# nor from a cache directory that someone else owns or can write to. An entry
+# is trusted while the script's mtime and size are unchanged; otherwise the
+# source is re-read and its hash decides whether the entry can still be used.
+# Set ZINGO_CACHE=0 to bypass the cache.
+CACHE_MAGIC = 'zingo-all-in-ast-1'
+
+def cache_dir():
+    directory = os.environ.get('ZINGO_CACHE_DIR')
+    if not directory:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        directory = os.path.join(base, 'zingo')
+    return directory
+
+def cache_path(path):
+    path = os.path.abspath(path)
+    key = hashlib.sha256(f'{CACHE_MAGIC}:{path}'.encode()).hexdigest()[:32]
+    return os.path.join(cache_dir(), f'{os.path.basename(path)}-{key}.zc')
+
+def is_private_dir(directory):
+    try:
+        info = os.stat(directory)
+    except OSError:
+        return False
+
+    # Windows has no owner ids, and its per-user profile is private already
+    if not hasattr(os, 'getuid'):
+        return True
+    return info.st_uid == os.getuid() and not info.st_mode & 0o022
+
+def read_cache_entry(path):
+    if not is_private_dir(cache_dir()):
+        return None
+
+    try:
+        with open(cache_path(path), 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:
+        return None
+
+    if type(entry) is not tuple or len(entry) != 6 or entry[0] != CACHE_MAGIC:
+        return None
+    return entry
+
+def write_cache_entry(path, entry):
+    target = cache_path(path)
+    temp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        os.makedirs(os.path.dirname(target), mode=0o700, exist_ok=True)
+        if not is_private_dir(os.path.dirname(target)):
+            return
+        with open(temp, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, target)
+    except (OSError, pickle.PicklingError, RecursionError):
+        # The cache is only an accelerator, a script that can't be cached
+        # still runs
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+# Returns (node, error) like parse, and raises OSError when the script can't
+# be read.
+def load_program(path, fn=None):
+    fn = fn or path
+
+    if os.environ.get('ZINGO_CACHE', '1') == '0':
+        with open(path, 'r') as f:
+            return parse(fn, f.read())
+
+    stat = os.stat(path)
+    entry = read_cache_entry(path)
+    if entry and entry[1] == fn and entry[2] == stat.st_mtime_ns and entry[3] == stat.st_size:
+        return entry[5], None
+
+    with open(path, 'r') as f:
+        text = f.read()
+    digest = hashlib.sha256(text.encode()).hexdigest()
+
+    if entry and entry[1] == fn and entry[4] == digest:
+        node = entry[5]
+    else:
+        node, error = parse(fn, text)
+        if error:
+            return None, error
+
+    write_cache_entry(path, (CACHE_MAGIC, fn, stat.st_mtime_ns, stat.st_size, digest, node))
+    return node, None
@@ -1,37 +1,144 @@
-from utils.basic import String, Context, global_symbol_table
+from utils.basic import Number, String, List, BaseFunction, Context, new_global_scope, to_value
 import utils.basic as basic
 
 # utils/zingo_engine.py
 import sys
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, CancelledError
+
+try:
+    from kivy.clock import Clock
+except ImportError:
+    Clock = None
 
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import paths
 
+class ZingoError(Exception):
+    """A Zingo error raised while loading a session or calling into it."""
+    def __init__(self, error):
+        super().__init__(error.as_string())
+        self.error = error
+
+
+def from_zingo(value):
+    if isinstance(value, (Number, String)):
+        return value.value
+    if isinstance(value, List):
+        return [from_zingo(element) for element in value.elements]
+    return value
+
+
+class ZingoSession:
+    """A .zingo module that is parsed and executed once, then called into."""
+    def __init__(self, filepath: str=paths.ZINGO_FILE, input_value: str="", budget=None):
+        self.filepath = filepath
+        self.budget = budget
+
+        self.context = Context('<session>')
+        self.context.symbol_table = new_global_scope()
+        self.context.symbol_table.set("input_value", String(input_value))
+
+        try:
+            _, error = basic.run_file(filepath, self.context, budget=budget)
+        except FileNotFoundError:
+            raise ValueError(f"Zingo file not found: {filepath}")
+
+        if error:
+            raise ZingoError(error)
+
+    def get(self, name):
+        return from_zingo(self.context.symbol_table.get(name))
+
+    def set(self, name, value):
+        self.context.symbol_table.set(name, to_value(value))
+
+    def call(self, name, *args):
+        """Call the Zingo function `name` and return its result as a Python value."""
+        func = self.context.symbol_table.get(name)
+        if not isinstance(func, BaseFunction):
+            raise ValueError(f"Zingo function not found: {name}")
+
+        func = func.copy().set_context(self.context)
+        previous_meter = basic.start_budget(self.budget)
+        try:
+            result = func.execute([to_value(arg) for arg in args])
+        except RecursionError:
+            result = basic.RTResult().failure(basic.RTError(
+                func.pos_start, func.pos_end,
+                'Maximum recursion depth exceeded',
+                self.context
+            ))
+        finally:
+            basic.run_state.meter = previous_meter
+
+        if result.error:
+            raise ZingoError(result.error)
+
+        return from_zingo(result.value)
+
+
+class ZingoFuture(Future):
+    """The pending result of ZingoEngine.run_async."""
+    def __init__(self, meter):
+        super().__init__()
+        self.meter = meter
+
+    def request_stop(self):
+        """Stop the script, even mid-run, and return False if it already finished.
+
+        Unlike cancel(), this also reaches a script that has started: it stops
+        at its next budget check and the future then fails with CancelledError.
+        """
+        self.meter.cancel()
+        return self.cancel() or not self.done()
+
+
 class ZingoEngine:
-    def __init__(self):
+    # budget, a basic.Budget, limits every script the engine runs, e.g.
+    # Budget(max_seconds=1.0) so a runaway loop can't freeze the app when
+    # scripts run on the UI thread. Without one, scripts run to completion.
+    def __init__(self, budget=None):
         self.variables = {}
         self.output = []
         self.return_value = None
+        self.session = None
+        self.budget = budget
+        self.executor = None
+        self.futures = set()
+        self.lock = threading.Lock()
+
+    def load(self, filepath: str=paths.ZINGO_FILE, input_value: str=""):
+        """Load a .zingo file once so its functions can be called repeatedly."""
+        self.session = ZingoSession(filepath, input_value, self.budget)
+        return self.session
+
+    def call(self, name, *args):
+        """Call a function of the loaded script, loading paths.ZINGO_FILE on first use."""
+        if self.session is None:
+            self.load()
+        return self.session.call(name, *args)
 
     def run_string(self, code: str):
         # you already have this implemented
         return self._execute(code)
 
-    def run_zingo(self, text, filepath: str=paths.ZINGO_FILE):
+    def run_zingo(self, text, filepath: str=paths.ZINGO_FILE, budget=None):
         """Read a .zingo file and run it."""
-        try:
-            with open(filepath, "r") as f:
-                zingo_code = f.read()
+        if budget is None:
+            budget = self.budget
 
+        try:
             context = Context('<bridge_test>')
-            context.symbol_table = global_symbol_table
+            context.symbol_table = new_global_scope()
 
             context.symbol_table.set("input_value", String(text))
 
-            result, error = basic.run("test.zingo", zingo_code, context) 
+            # Warm runs reuse the parsed program from the on-disk cache
+            result, error = basic.run_file(filepath, context, budget=budget)
 
             if error:
                 return error.as_string()
@@ -41,6 +148,56 @@ class ZingoEngine:
         except FileNotFoundError:
             raise ValueError(f"Zingo file not found: {filepath}")
 
+    def run_async(self, text, callback=None, filepath: str=paths.ZINGO_FILE):
+        """Run the script like run_zingo on a worker thread and return a ZingoFuture.
+
+        callback(future) is called on the Kivy main thread through
+        Clock.schedule_once once the script finishes, and not at all if it was
+        cancelled or stopped with request_stop(). Without Kivy it is called on
+        the worker thread.
+        """
+        meter = (self.budget or basic.Budget()).start()
+        future = ZingoFuture(meter)
+
+        def work():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = self.run_zingo(text, filepath, budget=meter)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                if meter.cancelled:
+                    future.set_exception(CancelledError())
+                else:
+                    future.set_result(result)
+
+        def done(future):
+            with self.lock:
+                self.futures.discard(future)
+            if callback is None or future.cancelled() or isinstance(future.exception(), CancelledError):
+                return
+            if Clock is None:
+                callback(future)
+            else:
+                Clock.schedule_once(lambda dt: callback(future), 0)
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zingo")
+            self.futures.add(future)
+
+        future.add_done_callback(done)
+        self.executor.submit(work)
+        return future
+
+    def cancel_all(self):
+        """Stop every script started with run_async that hasn't finished."""
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.request_stop()
+
 
 if __name__ == "__main__":
     engine = ZingoEngine()
\ No newline at end of file
@@ -7,6 +7,29 @@ from string_with_arrows import *
 import string
 import os
 import math
+import bisect
+import re
+import pickle
+import hashlib
+import collections
+import threading
+import concurrent.futures
+import time
+import sys
+
+import array
+import operator
+import itertools
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 #######################################
 # CONSTANTS
@@ -72,26 +95,66 @@ class RTError(Error):
 # POSITION
 #######################################
 
+# The file positions point into. Where its lines start is only worked out
+# the first time an error needs a line or column number. Cached trees are
+# shared between threads, so the list is built aside and published whole.
+class Source:
+  __slots__ = ('fn', 'text', 'line_starts')
+
+  def __init__(self, fn, text):
+    self.fn = fn
+    self.text = text
+    self.line_starts = None
+
+  def line_col(self, idx):
+    line_starts = self.line_starts
+    if line_starts is None:
+      line_starts = [0]
+      idx_newline = self.text.find('\n')
+      while idx_newline >= 0:
+        line_starts.append(idx_newline + 1)
+        idx_newline = self.text.find('\n', idx_newline + 1)
+      self.line_starts = line_starts
+
+    ln = bisect.bisect_right(line_starts, idx) - 1
+    return ln, idx - line_starts[ln]
+
+# An offset into a Source. Positions never change once made, so tokens and
+# nodes share them instead of copying.
 class Position:
-  def __init__(self, idx, ln, col, fn, ftxt):
+  __slots__ = ('idx', 'source')
+
+  def __init__(self, idx, source):
     self.idx = idx
-    self.ln = ln
-    self.col = col
-    self.fn = fn
-    self.ftxt = ftxt
+    self.source = source
 
-  def advance(self, current_char=None):
-    self.idx += 1
-    self.col += 1
+  def line_col(self):
+    return self.source.line_col(self.idx)
 
-    if current_char == '\n':
-      self.ln += 1
-      self.col = 0
+  @property
+  def ln(self):
+    return self.line_col()[0]
 
-    return self
+  @property
+  def col(self):
+    return self.line_col()[1]
 
-  def copy(self):
-    return Position(self.idx, self.ln, self.col, self.fn, self.ftxt)
+  @property
+  def fn(self):
+    return self.source.fn
+
+  @property
+  def ftxt(self):
+    return self.source.text
+
+# The end of a span sits just past its last character, and stays on that
+# character's line even when the character is a newline.
+class EndPosition(Position):
+  __slots__ = ()
+
+  def line_col(self):
+    ln, col = self.source.line_col(self.idx - 1)
+    return ln, col + 1
 
 #######################################
 # TOKENS
@@ -143,18 +206,28 @@ KEYWORDS = [
   'BRUH',
 ]
 
+# Keywords can span several words. The lexer reads one word at a time and
+# keeps going while the words so far are the start of a longer keyword.
+KEYWORD_SET = set(KEYWORDS)
+KEYWORD_PREFIXES = {
+  ' '.join(keyword.split(' ')[:word_count])
+  for keyword in KEYWORDS
+  for word_count in range(1, keyword.count(' ') + 1)
+}
+
 class Token:
+  __slots__ = ('type', 'value', 'pos_start', 'pos_end')
+
   def __init__(self, type_, value=None, pos_start=None, pos_end=None):
     self.type = type_
     self.value = value
 
     if pos_start:
-      self.pos_start = pos_start.copy()
-      self.pos_end = pos_start.copy()
-      self.pos_end.advance()
+      self.pos_start = pos_start
+      self.pos_end = EndPosition(pos_start.idx + 1, pos_start.source)
 
     if pos_end:
-      self.pos_end = pos_end.copy()
+      self.pos_end = pos_end
 
   def matches(self, type_, value):
     return self.type == type_ and self.value == value
@@ -171,13 +244,20 @@ class Lexer:
   def __init__(self, fn, text):
     self.fn = fn
     self.text = text
-    self.pos = Position(-1, 0, -1, fn, text)
+    self.source = Source(fn, text)
+    self.idx = -1
     self.current_char = None
     self.advance()
   
   def advance(self):
-    self.pos.advance(self.current_char)
-    self.current_char = self.text[self.pos.idx] if self.pos.idx < len(self.text) else None
+    self.idx += 1
+    self.current_char = self.text[self.idx] if self.idx < len(self.text) else None
+
+  def start_pos(self):
+    return Position(self.idx, self.source)
+
+  def end_pos(self):
+    return EndPosition(self.idx, self.source)
 
   def make_tokens(self):
     tokens = []
@@ -188,7 +268,7 @@ class Lexer:
       elif self.current_char == '#':
         self.skip_comment()
       elif self.current_char in ';\n':
-        tokens.append(Token(TT_NEWLINE, pos_start=self.pos))
+        tokens.append(Token(TT_NEWLINE, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char in DIGITS:
         tokens.append(self.make_number())
@@ -197,30 +277,30 @@ class Lexer:
       elif self.current_char == '"':
         tokens.append(self.make_string())
       elif self.current_char == '+':
-        tokens.append(Token(TT_PLUS, pos_start=self.pos))
+        tokens.append(Token(TT_PLUS, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '-':
         tokens.append(self.make_minus_or_arrow())
       elif self.current_char == '*':
-        tokens.append(Token(TT_MUL, pos_start=self.pos))
+        tokens.append(Token(TT_MUL, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '/':
-        tokens.append(Token(TT_DIV, pos_start=self.pos))
+        tokens.append(Token(TT_DIV, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '^':
-        tokens.append(Token(TT_POW, pos_start=self.pos))
+        tokens.append(Token(TT_POW, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '(':
-        tokens.append(Token(TT_LPAREN, pos_start=self.pos))
+        tokens.append(Token(TT_LPAREN, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == ')':
-        tokens.append(Token(TT_RPAREN, pos_start=self.pos))
+        tokens.append(Token(TT_RPAREN, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '[':
-        tokens.append(Token(TT_LSQUARE, pos_start=self.pos))
+        tokens.append(Token(TT_LSQUARE, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == ']':
-        tokens.append(Token(TT_RSQUARE, pos_start=self.pos))
+        tokens.append(Token(TT_RSQUARE, pos_start=self.start_pos()))
         self.advance()
       elif self.current_char == '!':
         token, error = self.make_not_equals()
@@ -233,21 +313,21 @@ class Lexer:
       elif self.current_char == '>':
         tokens.append(self.make_greater_than())
       elif self.current_char == ',':
-        tokens.append(Token(TT_COMMA, pos_start=self.pos))
+        tokens.append(Token(TT_COMMA, pos_start=self.start_pos()))
         self.advance()
       else:
-        pos_start = self.pos.copy()
+        pos_start = self.start_pos()
         char = self.current_char
         self.advance()
-        return [], IllegalCharError(pos_start, self.pos, "'" + char + "'")
+        return [], IllegalCharError(pos_start, self.end_pos(), "'" + char + "'")
 
-    tokens.append(Token(TT_EOF, pos_start=self.pos))
+    tokens.append(Token(TT_EOF, pos_start=self.start_pos()))
     return tokens, None
 
   def make_number(self):
     num_str = ''
     dot_count = 0
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
 
     while self.current_char != None and self.current_char in DIGITS + '.':
       if self.current_char == '.':
@@ -257,13 +337,13 @@ class Lexer:
       self.advance()
 
     if dot_count == 0:
-      return Token(TT_INT, int(num_str), pos_start, self.pos)
+      return Token(TT_INT, int(num_str), pos_start, self.end_pos())
     else:
-      return Token(TT_FLOAT, float(num_str), pos_start, self.pos)
+      return Token(TT_FLOAT, float(num_str), pos_start, self.end_pos())
 
   def make_string(self):
     string = ''
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     escape_character = False
     self.advance()
 
@@ -284,89 +364,211 @@ class Lexer:
       escape_character = False
     
     self.advance()
-    return Token(TT_STRING, string, pos_start, self.pos)
+    return Token(TT_STRING, string, pos_start, self.end_pos())
 
   def make_identifier(self):
-    id_str = ''
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
+    id_str = self.make_word()
+    phrase = id_str
+    keyword = id_str if id_str in KEYWORD_SET else None
+    idx_end = self.idx
+
+    while phrase in KEYWORD_PREFIXES:
+      while self.current_char != None and self.current_char in ' \t':
+        self.advance()
+      if self.current_char == None or self.current_char not in LETTERS: break
+
+      phrase += ' ' + self.make_word()
+      if phrase in KEYWORD_SET:
+        keyword = phrase
+        idx_end = self.idx
+
+    # Step back to the end of the longest keyword, or of the first word
+    self.idx = idx_end - 1
+    self.advance()
+
+    if keyword: return Token(TT_KEYWORD, keyword, pos_start, self.end_pos())
+    return Token(TT_IDENTIFIER, id_str, pos_start, self.end_pos())
+
+  def make_word(self):
+    idx_start = self.idx
 
     while self.current_char != None and self.current_char in LETTERS_DIGITS + '_':
-      id_str += self.current_char
       self.advance()
 
-    tok_type = TT_KEYWORD if id_str in KEYWORDS else TT_IDENTIFIER
-    return Token(tok_type, id_str, pos_start, self.pos)
+    return self.text[idx_start:self.idx]
 
   def make_minus_or_arrow(self):
     tok_type = TT_MINUS
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     self.advance()
 
     if self.current_char == '>':
       self.advance()
       tok_type = TT_ARROW
 
-    return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+    return Token(tok_type, pos_start=pos_start, pos_end=self.end_pos())
 
   def make_not_equals(self):
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     self.advance()
 
     if self.current_char == '=':
       self.advance()
-      return Token(TT_NE, pos_start=pos_start, pos_end=self.pos), None
+      return Token(TT_NE, pos_start=pos_start, pos_end=self.end_pos()), None
 
     self.advance()
-    return None, ExpectedCharError(pos_start, self.pos, "'=' (after '!')")
+    return None, ExpectedCharError(pos_start, self.end_pos(), "'=' (after '!')")
   
   def make_equals(self):
     tok_type = TT_EQ
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     self.advance()
 
     if self.current_char == '=':
       self.advance()
       tok_type = TT_EE
 
-    return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+    return Token(tok_type, pos_start=pos_start, pos_end=self.end_pos())
 
   def make_less_than(self):
     tok_type = TT_LT
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     self.advance()
 
     if self.current_char == '=':
       self.advance()
       tok_type = TT_LTE
 
-    return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+    return Token(tok_type, pos_start=pos_start, pos_end=self.end_pos())
 
   def make_greater_than(self):
     tok_type = TT_GT
-    pos_start = self.pos.copy()
+    pos_start = self.start_pos()
     self.advance()
 
     if self.current_char == '=':
       self.advance()
       tok_type = TT_GTE
 
-    return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+    return Token(tok_type, pos_start=pos_start, pos_end=self.end_pos())
 
   def skip_comment(self):
     self.advance()
 
-    while self.current_char != '\n':
+    while self.current_char != None and self.current_char != '\n':
       self.advance()
 
-    self.advance()
+    if self.current_char == '\n':
+      self.advance()
+
+#######################################
+# REGEX LEXER
+#######################################
+
+MULTI_WORD_KEYWORD_PATTERN = '|'.join(
+  r'[ \t]+'.join(re.escape(word) for word in keyword.split(' '))
+  for keyword in sorted(KEYWORDS, key=lambda keyword: keyword.count(' '), reverse=True)
+  if ' ' in keyword
+)
+
+# Blanks and comments are matched as the prefix of the following token
+TOKEN_PATTERN = re.compile(rf'''
+  (?: [ \t] | \#[^\n]*\n? )*
+  (?:
+    (?P<NEWLINE>[;\n])
+  | (?P<FLOAT>[0-9]+\.[0-9]*)
+  | (?P<INT>[0-9]+)
+  | (?P<KEYWORD>(?:{MULTI_WORD_KEYWORD_PATTERN})(?![A-Za-z0-9_]))
+  | (?P<IDENTIFIER>[A-Za-z][A-Za-z0-9_]*)
+  | (?P<STRING>"[^"]*"?)
+  | (?P<ARROW>->)
+  | (?P<NE>!=)
+  | (?P<EXPECTED_EQ>!)
+  | (?P<EE>==)
+  | (?P<LTE><=)
+  | (?P<GTE>>=)
+  | (?P<SINGLE>[-+*/^()\[\],=<>])
+  | (?P<ILLEGAL>.)
+  | (?P<EOF>$)
+  )
+''', re.VERBOSE | re.DOTALL)
+
+SINGLE_CHAR_TOKENS = {
+  '+': TT_PLUS,
+  '-': TT_MINUS,
+  '*': TT_MUL,
+  '/': TT_DIV,
+  '^': TT_POW,
+  '(': TT_LPAREN,
+  ')': TT_RPAREN,
+  '[': TT_LSQUARE,
+  ']': TT_RSQUARE,
+  ',': TT_COMMA,
+  '=': TT_EQ,
+  '<': TT_LT,
+  '>': TT_GT,
+}
+
+# Scans the text with one master pattern instead of a character at a time.
+# It gives the same tokens and errors as Lexer, which stays as the reference.
+class RegexLexer(Lexer):
+  def make_tokens(self):
+    tokens = []
+    source = self.source
+    end_idx = len(self.text)
+
+    for match in TOKEN_PATTERN.finditer(self.text):
+      kind = match.lastgroup
+      idx_start, idx_end = match.span(kind)
+
+      if kind == 'IDENTIFIER':
+        id_str = match.group(kind)
+        tok_type = TT_KEYWORD if id_str in KEYWORD_SET else TT_IDENTIFIER
+        tokens.append(Token(tok_type, id_str, Position(idx_start, source), EndPosition(idx_end, source)))
+      elif kind == 'KEYWORD':
+        keyword = ' '.join(match.group(kind).split())
+        tokens.append(Token(TT_KEYWORD, keyword, Position(idx_start, source), EndPosition(idx_end, source)))
+      elif kind == 'SINGLE':
+        tokens.append(Token(SINGLE_CHAR_TOKENS[match.group(kind)], pos_start=Position(idx_start, source)))
+      elif kind == 'NEWLINE':
+        tokens.append(Token(TT_NEWLINE, pos_start=Position(idx_start, source)))
+      elif kind == 'INT':
+        tokens.append(Token(TT_INT, int(match.group(kind)), Position(idx_start, source), EndPosition(idx_end, source)))
+      elif kind == 'FLOAT':
+        tokens.append(Token(TT_FLOAT, float(match.group(kind)), Position(idx_start, source), EndPosition(idx_end, source)))
+      elif kind == 'STRING':
+        # Lexer drops every backslash and steps past the end of an unclosed string
+        lexeme = match.group(kind)
+        if len(lexeme) > 1 and lexeme[-1] == '"':
+          string = lexeme[1:-1]
+        else:
+          string = lexeme[1:]
+          idx_end = end_idx = idx_end + 1
+        tokens.append(Token(TT_STRING, string.replace('\\', ''), Position(idx_start, source), EndPosition(idx_end, source)))
+      elif kind == 'EXPECTED_EQ':
+        return [], ExpectedCharError(Position(idx_start, source), EndPosition(idx_start + 2, source), "'=' (after '!')")
+      elif kind == 'EOF':
+        break
+      elif kind == 'ILLEGAL':
+        return [], IllegalCharError(Position(idx_start, source), EndPosition(idx_end, source), "'" + match.group(kind) + "'")
+      else:
+        tokens.append(Token(kind, pos_start=Position(idx_start, source), pos_end=EndPosition(idx_end, source)))
+
+    tokens.append(Token(TT_EOF, pos_start=Position(end_idx, source)))
+    return tokens, None
 
 #######################################
 # NODES
 #######################################
 
+# Literals are turned into their runtime value once, while parsing
 class NumberNode:
+  __slots__ = ('tok', 'value', 'pos_start', 'pos_end')
+
   def __init__(self, tok):
     self.tok = tok
+    self.value = Number.of(tok.value)
 
     self.pos_start = self.tok.pos_start
     self.pos_end = self.tok.pos_end
@@ -375,8 +577,11 @@ class NumberNode:
     return f'{self.tok}'
 
 class StringNode:
+  __slots__ = ('tok', 'value', 'pos_start', 'pos_end')
+
   def __init__(self, tok):
     self.tok = tok
+    self.value = String(tok.value)
 
     self.pos_start = self.tok.pos_start
     self.pos_end = self.tok.pos_end
@@ -385,6 +590,8 @@ class StringNode:
     return f'{self.tok}'
 
 class ListNode:
+  __slots__ = ('element_nodes', 'pos_start', 'pos_end')
+
   def __init__(self, element_nodes, pos_start, pos_end):
     self.element_nodes = element_nodes
 
@@ -392,6 +599,8 @@ class ListNode:
     self.pos_end = pos_end
 
 class VarAccessNode:
+  __slots__ = ('var_name_tok', 'pos_start', 'pos_end')
+
   def __init__(self, var_name_tok):
     self.var_name_tok = var_name_tok
 
@@ -399,6 +608,8 @@ class VarAccessNode:
     self.pos_end = self.var_name_tok.pos_end
 
 class VarAssignNode:
+  __slots__ = ('var_name_tok', 'value_node', 'pos_start', 'pos_end')
+
   def __init__(self, var_name_tok, value_node):
     self.var_name_tok = var_name_tok
     self.value_node = value_node
@@ -407,6 +618,8 @@ class VarAssignNode:
     self.pos_end = self.value_node.pos_end
 
 class BinOpNode:
+  __slots__ = ('left_node', 'op_tok', 'right_node', 'pos_start', 'pos_end')
+
   def __init__(self, left_node, op_tok, right_node):
     self.left_node = left_node
     self.op_tok = op_tok
@@ -419,6 +632,8 @@ class BinOpNode:
     return f'({self.left_node}, {self.op_tok}, {self.right_node})'
 
 class UnaryOpNode:
+  __slots__ = ('op_tok', 'node', 'pos_start', 'pos_end')
+
   def __init__(self, op_tok, node):
     self.op_tok = op_tok
     self.node = node
@@ -430,6 +645,8 @@ class UnaryOpNode:
     return f'({self.op_tok}, {self.node})'
 
 class IfNode:
+  __slots__ = ('cases', 'else_case', 'pos_start', 'pos_end')
+
   def __init__(self, cases, else_case):
     self.cases = cases
     self.else_case = else_case
@@ -438,6 +655,8 @@ class IfNode:
     self.pos_end = (self.else_case or self.cases[len(self.cases) - 1])[0].pos_end
 
 class ForNode:
+  __slots__ = ('var_name_tok', 'start_value_node', 'end_value_node', 'step_value_node', 'body_node', 'should_return_null', 'pos_start', 'pos_end')
+
   def __init__(self, var_name_tok, start_value_node, end_value_node, step_value_node, body_node, should_return_null):
     self.var_name_tok = var_name_tok
     self.start_value_node = start_value_node
@@ -449,7 +668,21 @@ class ForNode:
     self.pos_start = self.var_name_tok.pos_start
     self.pos_end = self.body_node.pos_end
 
+class ForEachNode:
+  __slots__ = ('var_name_tok', 'iterable_node', 'body_node', 'should_return_null', 'pos_start', 'pos_end')
+
+  def __init__(self, var_name_tok, iterable_node, body_node, should_return_null):
+    self.var_name_tok = var_name_tok
+    self.iterable_node = iterable_node
+    self.body_node = body_node
+    self.should_return_null = should_return_null
+
+    self.pos_start = self.var_name_tok.pos_start
+    self.pos_end = self.body_node.pos_end
+
 class WhileNode:
+  __slots__ = ('condition_node', 'body_node', 'should_return_null', 'pos_start', 'pos_end')
+
   def __init__(self, condition_node, body_node, should_return_null):
     self.condition_node = condition_node
     self.body_node = body_node
@@ -459,6 +692,8 @@ class WhileNode:
     self.pos_end = self.body_node.pos_end
 
 class FuncDefNode:
+  __slots__ = ('var_name_tok', 'arg_name_toks', 'body_node', 'should_auto_return', 'pos_start', 'pos_end')
+
   def __init__(self, var_name_tok, arg_name_toks, body_node, should_auto_return):
     self.var_name_tok = var_name_tok
     self.arg_name_toks = arg_name_toks
@@ -475,6 +710,8 @@ class FuncDefNode:
     self.pos_end = self.body_node.pos_end
 
 class CallNode:
+  __slots__ = ('node_to_call', 'arg_nodes', 'pos_start', 'pos_end')
+
   def __init__(self, node_to_call, arg_nodes):
     self.node_to_call = node_to_call
     self.arg_nodes = arg_nodes
@@ -487,6 +724,8 @@ class CallNode:
       self.pos_end = self.node_to_call.pos_end
 
 class ReturnNode:
+  __slots__ = ('node_to_return', 'pos_start', 'pos_end')
+
   def __init__(self, node_to_return, pos_start, pos_end):
     self.node_to_return = node_to_return
 
@@ -494,15 +733,31 @@ class ReturnNode:
     self.pos_end = pos_end
 
 class ContinueNode:
+  __slots__ = ('pos_start', 'pos_end')
+
   def __init__(self, pos_start, pos_end):
     self.pos_start = pos_start
     self.pos_end = pos_end
 
 class BreakNode:
+  __slots__ = ('pos_start', 'pos_end')
+
   def __init__(self, pos_start, pos_end):
     self.pos_start = pos_start
     self.pos_end = pos_end
 
+# A run of binary operations parses into a left-deep chain of BinOpNodes.
+# Passes over the tree follow the chain in a loop rather than recursing once
+# per operand, so long expressions stay clear of Python's recursion limit.
+# Returns the leftmost operand and the chain's nodes, innermost first.
+def bin_op_chain(node):
+  chain = []
+  while isinstance(node, BinOpNode):
+    chain.append(node)
+    node = node.left_node
+  chain.reverse()
+  return node, chain
+
 #######################################
 # PARSE RESULT
 #######################################
@@ -513,7 +768,6 @@ class ParseResult:
     self.node = None
     self.last_registered_advance_count = 0
     self.advance_count = 0
-    self.to_reverse_count = 0
 
   def register_advancement(self):
     self.last_registered_advance_count = 1
@@ -525,12 +779,6 @@ class ParseResult:
     if res.error: self.error = res.error
     return res.node
 
-  def try_register(self, res):
-    if res.error:
-      self.to_reverse_count = res.advance_count
-      return None
-    return self.register(res)
-
   def success(self, node):
     self.node = node
     return self
@@ -544,6 +792,37 @@ class ParseResult:
 # PARSER
 #######################################
 
+# The tokens an expression or a statement can begin with. They let the parser
+# see where a block or an optional expression ends without parsing ahead.
+EXPR_START_TYPES = {TT_INT, TT_FLOAT, TT_STRING, TT_IDENTIFIER, TT_PLUS, TT_MINUS, TT_LPAREN, TT_LSQUARE}
+EXPR_START_KEYWORDS = {'PLUH', 'CAP', 'CHAT IS THIS REAL', 'MEWING', 'LET HIM COOK', 'BOP'}
+STATEMENT_START_KEYWORDS = EXPR_START_KEYWORDS | {'ITS GIVING', 'YES DADDY', 'BRUH'}
+
+EXPECTED_EXPR = "Expected 'PLUH', 'CHAT IS THIS REAL', 'MEWING', 'LET HIM COOK', 'BOP', int, float, identifier, '+', '-', '(', '[' or 'CAP'"
+EXPECTED_COMP_EXPR = "Expected int, float, identifier, '+', '-', '(', '[', 'CHAT IS THIS REAL', 'MEWING', 'LET HIM COOK', 'BOP' or 'CAP'"
+
+# Binary operators by precedence. On the operator stack a left-associative
+# operator binds one above its precedence, so an operator of the same level
+# reduces it first; '^' binds at its own level and so groups to the right.
+# Unary '+'/'-' bind just below '^' and CAP just above AND/OR.
+BINARY_PRECEDENCE = {
+  'AND': 2,
+  'OR': 2,
+  TT_EE: 4,
+  TT_NE: 4,
+  TT_LT: 4,
+  TT_GT: 4,
+  TT_LTE: 4,
+  TT_GTE: 4,
+  TT_PLUS: 6,
+  TT_MINUS: 6,
+  TT_MUL: 8,
+  TT_DIV: 8,
+  TT_POW: 10,
+}
+SIGN_BINDING = 9
+CAP_BINDING = 3
+
 class Parser:
   def __init__(self, tokens):
     self.tokens = tokens
@@ -555,15 +834,20 @@ class Parser:
     self.update_current_tok()
     return self.current_tok
 
-  def reverse(self, amount=1):
-    self.tok_idx -= amount
-    self.update_current_tok()
-    return self.current_tok
-
   def update_current_tok(self):
     if self.tok_idx >= 0 and self.tok_idx < len(self.tokens):
       self.current_tok = self.tokens[self.tok_idx]
 
+  def starts_expr(self):
+    if self.current_tok.type == TT_KEYWORD:
+      return self.current_tok.value in EXPR_START_KEYWORDS
+    return self.current_tok.type in EXPR_START_TYPES
+
+  def starts_statement(self):
+    if self.current_tok.type == TT_KEYWORD:
+      return self.current_tok.value in STATEMENT_START_KEYWORDS
+    return self.current_tok.type in EXPR_START_TYPES
+
   def parse(self):
     res = self.statements()
     if not res.error and self.current_tok.type != TT_EOF:
@@ -578,7 +862,7 @@ class Parser:
   def statements(self):
     res = ParseResult()
     statements = []
-    pos_start = self.current_tok.pos_start.copy()
+    pos_start = self.current_tok.pos_start
 
     while self.current_tok.type == TT_NEWLINE:
       res.register_advancement()
@@ -588,53 +872,63 @@ class Parser:
     if res.error: return res
     statements.append(statement)
 
-    more_statements = True
-
-    while True:
-      newline_count = 0
+    while self.current_tok.type == TT_NEWLINE:
       while self.current_tok.type == TT_NEWLINE:
         res.register_advancement()
         self.advance()
-        newline_count += 1
-      if newline_count == 0:
-        more_statements = False
-      
-      if not more_statements: break
-      statement = res.try_register(self.statement())
-      if not statement:
-        self.reverse(res.to_reverse_count)
-        more_statements = False
-        continue
+
+      # The block ends at the first line that cannot start a statement
+      if not self.starts_statement(): break
+
+      statement = res.register(self.statement())
+      if res.error: return res
       statements.append(statement)
 
     return res.success(ListNode(
       statements,
       pos_start,
-      self.current_tok.pos_end.copy()
+      self.current_tok.pos_end
     ))
 
+  # The value of a multi-line block is thrown away, so the one-line loops
+  # in its statements would build their result lists for nothing
+  def discard(self, node):
+    if isinstance(node, (ForNode, ForEachNode, WhileNode)):
+      node.should_return_null = True
+      self.discard(node.body_node)
+    elif isinstance(node, IfNode):
+      for _, expr, _ in node.cases:
+        self.discard(expr)
+      if node.else_case:
+        self.discard(node.else_case[0])
+    elif isinstance(node, ListNode):
+      for element_node in node.element_nodes:
+        self.discard(element_node)
+    return node
+
   def statement(self):
     res = ParseResult()
-    pos_start = self.current_tok.pos_start.copy()
+    pos_start = self.current_tok.pos_start
 
     if self.current_tok.matches(TT_KEYWORD, 'ITS GIVING'):
       res.register_advancement()
       self.advance()
 
-      expr = res.try_register(self.expr())
-      if not expr:
-        self.reverse(res.to_reverse_count)
-      return res.success(ReturnNode(expr, pos_start, self.current_tok.pos_start.copy()))
+      expr = None
+      if self.starts_expr():
+        expr = res.register(self.expr())
+        if res.error: return res
+      return res.success(ReturnNode(expr, pos_start, self.current_tok.pos_start))
     
     if self.current_tok.matches(TT_KEYWORD, 'YES DADDY'):
       res.register_advancement()
       self.advance()
-      return res.success(ContinueNode(pos_start, self.current_tok.pos_start.copy()))
+      return res.success(ContinueNode(pos_start, self.current_tok.pos_start))
       
     if self.current_tok.matches(TT_KEYWORD, 'BRUH'):
       res.register_advancement()
       self.advance()
-      return res.success(BreakNode(pos_start, self.current_tok.pos_start.copy()))
+      return res.success(BreakNode(pos_start, self.current_tok.pos_start))
 
     expr = res.register(self.expr())
     if res.error:
@@ -673,65 +967,115 @@ class Parser:
       if res.error: return res
       return res.success(VarAssignNode(var_name, expr))
 
-    node = res.register(self.bin_op(self.comp_expr, ((TT_KEYWORD, 'AND'), (TT_KEYWORD, 'OR'))))
+    node = res.register(self.op_expr())
 
     if res.error:
       return res.failure(InvalidSyntaxError(
         self.current_tok.pos_start, self.current_tok.pos_end,
-        "Expected 'PLUH', 'CHAT IS THIS REAL', 'MEWING', 'LET HIM COOK', 'BOP', int, float, identifier, '+', '-', '(', '[' or 'CAP'"
+        EXPECTED_EXPR
       ))
 
     return res.success(node)
 
-  def comp_expr(self):
+  # Parses operators and parentheses with explicit stacks, so long chains and
+  # deep nesting do not recurse. The operator stack holds (binding, op_tok,
+  # is_prefix) entries, with None as the binding of an open parenthesis.
+  def op_expr(self):
     res = ParseResult()
+    operands = []
+    operators = []
+    allow_cap = True
+    expected = None
 
-    if self.current_tok.matches(TT_KEYWORD, 'CAP'):
-      op_tok = self.current_tok
-      res.register_advancement()
-      self.advance()
+    while True:
+      tok = self.current_tok
 
-      node = res.register(self.comp_expr())
-      if res.error: return res
-      return res.success(UnaryOpNode(op_tok, node))
-    
-    node = res.register(self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE)))
-    
-    if res.error:
-      return res.failure(InvalidSyntaxError(
-        self.current_tok.pos_start, self.current_tok.pos_end,
-        "Expected int, float, identifier, '+', '-', '(', '[', 'CHAT IS THIS REAL', 'MEWING', 'LET HIM COOK', 'BOP' or 'CAP'"
-      ))
+      if tok.type in (TT_PLUS, TT_MINUS):
+        operators.append((SIGN_BINDING, tok, True))
+        res.register_advancement()
+        self.advance()
+        allow_cap = False
+        expected = None
+        continue
 
-    return res.success(node)
+      if allow_cap and tok.matches(TT_KEYWORD, 'CAP'):
+        operators.append((CAP_BINDING, tok, True))
+        res.register_advancement()
+        self.advance()
+        expected = EXPECTED_COMP_EXPR
+        continue
 
-  def arith_expr(self):
-    return self.bin_op(self.term, (TT_PLUS, TT_MINUS))
+      # An assignment in parentheses is left to atom()
+      if tok.type == TT_LPAREN and not self.tokens[self.tok_idx + 1].matches(TT_KEYWORD, 'PLUH'):
+        operators.append((None, tok, False))
+        res.register_advancement()
+        self.advance()
+        allow_cap = True
+        expected = EXPECTED_EXPR
+        continue
 
-  def term(self):
-    return self.bin_op(self.factor, (TT_MUL, TT_DIV))
+      operand = res.register(self.call())
+      if res.error:
+        if not expected: return res
+        return res.failure(InvalidSyntaxError(
+          self.current_tok.pos_start, self.current_tok.pos_end,
+          expected
+        ))
+      operands.append(operand)
 
-  def factor(self):
-    res = ParseResult()
-    tok = self.current_tok
+      while True:
+        tok = self.current_tok
+        precedence = BINARY_PRECEDENCE.get(tok.value if tok.type == TT_KEYWORD else tok.type)
 
-    if tok.type in (TT_PLUS, TT_MINUS):
-      res.register_advancement()
-      self.advance()
-      factor = res.register(self.factor())
-      if res.error: return res
-      return res.success(UnaryOpNode(tok, factor))
+        if precedence:
+          self.reduce_operators(operands, operators, precedence)
+          binding = precedence if tok.type == TT_POW else precedence + 1
+          operators.append((binding, tok, False))
+          res.register_advancement()
+          self.advance()
+          allow_cap = precedence == BINARY_PRECEDENCE['AND']
+          expected = EXPECTED_COMP_EXPR if allow_cap else None
+          break
+
+        self.reduce_operators(operands, operators, 0)
+        if not operators:
+          return res.success(operands.pop())
+
+        if tok.type != TT_RPAREN:
+          return res.failure(InvalidSyntaxError(
+            tok.pos_start, tok.pos_end,
+            "Expected ')'"
+          ))
 
-    return self.power()
+        operators.pop()
+        res.register_advancement()
+        self.advance()
 
-  def power(self):
-    return self.bin_op(self.call, (TT_POW, ), self.factor)
+        call = res.register(self.call_args(operands.pop()))
+        if res.error: return res
+        operands.append(call)
+
+  def reduce_operators(self, operands, operators, precedence):
+    while operators and operators[-1][0] and operators[-1][0] > precedence:
+      _, op_tok, is_prefix = operators.pop()
+      right = operands.pop()
+      if is_prefix:
+        operands.append(UnaryOpNode(op_tok, right))
+      else:
+        operands.append(BinOpNode(operands.pop(), op_tok, right))
 
   def call(self):
     res = ParseResult()
     atom = res.register(self.atom())
     if res.error: return res
 
+    call = res.register(self.call_args(atom))
+    if res.error: return res
+    return res.success(call)
+
+  def call_args(self, atom):
+    res = ParseResult()
+
     if self.current_tok.type == TT_LPAREN:
       res.register_advancement()
       self.advance()
@@ -833,7 +1177,7 @@ class Parser:
   def list_expr(self):
     res = ParseResult()
     element_nodes = []
-    pos_start = self.current_tok.pos_start.copy()
+    pos_start = self.current_tok.pos_start
 
     if self.current_tok.type != TT_LSQUARE:
       return res.failure(InvalidSyntaxError(
@@ -874,7 +1218,7 @@ class Parser:
     return res.success(ListNode(
       element_nodes,
       pos_start,
-      self.current_tok.pos_end.copy()
+      self.current_tok.pos_end
     ))
 
   def if_expr(self):
@@ -901,7 +1245,7 @@ class Parser:
 
         statements = res.register(self.statements())
         if res.error: return res
-        else_case = (statements, True)
+        else_case = (self.discard(statements), True)
 
         if self.current_tok.matches(TT_KEYWORD, 'BOMBOCLATT'):
           res.register_advancement()
@@ -964,7 +1308,7 @@ class Parser:
 
       statements = res.register(self.statements())
       if res.error: return res
-      cases.append((condition, statements, True))
+      cases.append((condition, self.discard(statements), True))
 
       if self.current_tok.matches(TT_KEYWORD, 'BOMBOCLATT'):
         res.register_advancement()
@@ -1008,10 +1352,14 @@ class Parser:
     res.register_advancement()
     self.advance()
 
+    # IN is only special here, so it is still free to use as a variable name
+    if self.current_tok.type == TT_IDENTIFIER and self.current_tok.value == 'IN':
+      return self.for_each_expr(var_name)
+
     if self.current_tok.type != TT_EQ:
       return res.failure(InvalidSyntaxError(
         self.current_tok.pos_start, self.current_tok.pos_end,
-        f"Expected '='"
+        f"Expected '=' or 'IN'"
       ))
     
     res.register_advancement()
@@ -1032,7 +1380,7 @@ class Parser:
     end_value = res.register(self.expr())
     if res.error: return res
 
-    if self.current_tok.matches(TT_KEYWORD, 'SKIBDI'):
+    if self.current_tok.matches(TT_KEYWORD, 'SKIBIDI'):
       res.register_advancement()
       self.advance()
 
@@ -1041,37 +1389,25 @@ class Parser:
     else:
       step_value = None
 
-    if not self.current_tok.matches(TT_KEYWORD, 'THEN'):
-      return res.failure(InvalidSyntaxError(
-        self.current_tok.pos_start, self.current_tok.pos_end,
-        f"Expected 'THEN'"
-      ))
+    loop_body = res.register(self.loop_body())
+    if res.error: return res
+    body, should_return_null = loop_body
+
+    return res.success(ForNode(var_name, start_value, end_value, step_value, body, should_return_null))
 
+  def for_each_expr(self, var_name):
+    res = ParseResult()
     res.register_advancement()
     self.advance()
 
-    if self.current_tok.type == TT_NEWLINE:
-      res.register_advancement()
-      self.advance()
-
-      body = res.register(self.statements())
-      if res.error: return res
-
-      if not self.current_tok.matches(TT_KEYWORD, 'BOMBOCLATT'):
-        return res.failure(InvalidSyntaxError(
-          self.current_tok.pos_start, self.current_tok.pos_end,
-          f"Expected 'BOMBOCLATT'"
-        ))
-
-      res.register_advancement()
-      self.advance()
+    iterable = res.register(self.expr())
+    if res.error: return res
 
-      return res.success(ForNode(var_name, start_value, end_value, step_value, body, True))
-    
-    body = res.register(self.statement())
+    loop_body = res.register(self.loop_body())
     if res.error: return res
+    body, should_return_null = loop_body
 
-    return res.success(ForNode(var_name, start_value, end_value, step_value, body, False))
+    return res.success(ForEachNode(var_name, iterable, body, should_return_null))
 
   def while_expr(self):
     res = ParseResult()
@@ -1088,6 +1424,18 @@ class Parser:
     condition = res.register(self.expr())
     if res.error: return res
 
+    loop_body = res.register(self.loop_body())
+    if res.error: return res
+    body, should_return_null = loop_body
+
+    return res.success(WhileNode(condition, body, should_return_null))
+
+  # Parses 'THEN' and the loop body after it: a single statement, or a block
+  # of statements up to 'BOMBOCLATT' whose value is thrown away. Succeeds
+  # with (body, should_return_null).
+  def loop_body(self):
+    res = ParseResult()
+
     if not self.current_tok.matches(TT_KEYWORD, 'THEN'):
       return res.failure(InvalidSyntaxError(
         self.current_tok.pos_start, self.current_tok.pos_end,
@@ -1113,12 +1461,12 @@ class Parser:
       res.register_advancement()
       self.advance()
 
-      return res.success(WhileNode(condition, body, True))
-    
+      return res.success((self.discard(body), True))
+
     body = res.register(self.statement())
     if res.error: return res
 
-    return res.success(WhileNode(condition, body, False))
+    return res.success((body, False))
 
   def func_def(self):
     res = ParseResult()
@@ -1225,30 +1573,10 @@ class Parser:
     return res.success(FuncDefNode(
       var_name_tok,
       arg_name_toks,
-      body,
+      self.discard(body),
       False
     ))
 
-  ###################################
-
-  def bin_op(self, func_a, ops, func_b=None):
-    if func_b == None:
-      func_b = func_a
-    
-    res = ParseResult()
-    left = res.register(func_a())
-    if res.error: return res
-
-    while self.current_tok.type in ops or (self.current_tok.type, self.current_tok.value) in ops:
-      op_tok = self.current_tok
-      res.register_advancement()
-      self.advance()
-      right = res.register(func_b())
-      if res.error: return res
-      left = BinOpNode(left, op_tok, right)
-
-    return res.success(left)
-
 #######################################
 # RUNTIME RESULT
 #######################################
@@ -1305,14 +1633,165 @@ class RTResult:
       self.loop_should_break
     )
 
+# The Compiler's closures return plain values instead of an RTResult and
+# report everything else by raising one of these signals.
+class ErrorSignal(Exception):
+  def __init__(self, error):
+    self.error = error
+
+class ReturnSignal(Exception):
+  def __init__(self, value):
+    self.value = value
+
+class ContinueSignal(Exception):
+  pass
+
+class BreakSignal(Exception):
+  pass
+
+#######################################
+# RUN STATE
+#######################################
+
+# Per-thread state of the run in progress. TYPESHI appends to output when a
+# job has set it, so jobs that share a process never interleave on stdout,
+# and meter is the BudgetMeter the engines charge steps to. engine and
+# optimize are the settings of the innermost run, which RUN passes on to the
+# scripts it starts.
+class RunState(threading.local):
+  output = None
+  meter = None
+  engine = None
+  optimize = None
+
+run_state = RunState()
+
+# Limits on how much work a run may do. A step is a loop iteration or a
+# function call, which every long-running script has to go through; the
+# clock and memory use are only sampled once every check_interval steps.
+# max_depth limits how deeply function calls may nest, so runaway recursion
+# stops with an error at the call instead of exhausting Python's stack.
+# max_memory is process-wide: it limits the growth of the whole process's
+# resident memory since the run started, so memory allocated by other
+# threads in the meantime counts against the script too. It is a coarse
+# safety net for runs that have the process to themselves and is off
+# unless asked for.
+class Budget:
+  def __init__(self, max_steps=None, max_seconds=None, max_memory=None, max_depth=None, check_interval=256):
+    self.max_steps = max_steps
+    self.max_seconds = max_seconds
+    self.max_memory = max_memory
+    self.max_depth = max_depth
+    self.check_interval = check_interval
+
+  def start(self):
+    return BudgetMeter(self)
+
+class BudgetMeter:
+  def __init__(self, budget):
+    self.budget = budget
+    self.cancelled = False
+    self.start()
+
+  # A meter can be passed to a run in place of its Budget, so whoever holds
+  # it can cancel() the run from another thread
+  def start(self):
+    budget = self.budget
+    self.steps = 0
+    self.depth = 0
+    self.deadline = None
+    self.memory_base = None
+
+    if budget.max_seconds is not None:
+      self.deadline = time.monotonic() + budget.max_seconds
+    if budget.max_memory is not None:
+      self.memory_base = memory_usage()
+
+    self.batch = self.countdown = self.next_batch()
+    return self
+
+  # Takes effect at the next check, within check_interval steps
+  def cancel(self):
+    self.cancelled = True
+
+  # Returns an RTError once the budget is used up
+  def step(self, pos_start, pos_end, context):
+    self.countdown -= 1
+    if self.countdown: return None
+    return self.check(pos_start, pos_end, context)
+
+  def check(self, pos_start, pos_end, context):
+    budget = self.budget
+    self.steps += self.batch
+
+    if self.cancelled:
+      details = 'Script was cancelled'
+    elif budget.max_steps is not None and self.steps > budget.max_steps:
+      details = f'Step budget of {budget.max_steps} exceeded'
+    elif self.deadline is not None and time.monotonic() > self.deadline:
+      details = f'Time budget of {budget.max_seconds}s exceeded'
+    elif self.memory_base is not None and memory_usage() - self.memory_base > budget.max_memory:
+      details = f'Memory budget of {budget.max_memory} bytes exceeded'
+    else:
+      self.batch = self.countdown = self.next_batch()
+      return None
+
+    return RTError(pos_start, pos_end, details, context)
+
+  # Called on entering a function; the caller lowers depth again on leaving
+  def enter(self, pos_start, pos_end, context):
+    max_depth = self.budget.max_depth
+    if max_depth is not None and self.depth >= max_depth:
+      return RTError(pos_start, pos_end, f'Call depth limit of {max_depth} exceeded', context)
+    self.depth += 1
+    return None
+
+  def next_batch(self):
+    batch = self.budget.check_interval
+    if self.budget.max_steps is not None:
+      batch = min(batch, self.budget.max_steps - self.steps + 1)
+    return max(batch, 1)
+
+# The resident memory of the process in bytes. Only Linux reports the current
+# value cheaply, elsewhere the peak is used.
+def memory_usage():
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+  except (OSError, ValueError, AttributeError):
+    pass
+
+  if resource is None:
+    return 0
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+# Makes budget the limit for the runs started on this thread until the
+# returned meter is restored. Without a budget the current meter is kept, so
+# a script run from inside another stays within the outer limits.
+def start_budget(budget):
+  previous = run_state.meter
+  if budget is not None:
+    run_state.meter = budget.start()
+  return previous
+
 #######################################
 # VALUES
 #######################################
 
+# Values are shared rather than copied on every read, so they do not carry
+# a position or context while the program runs. Engines attach both with
+# located() only once an operation has failed and an error has to be built.
 class Value:
+  pos_start = None
+  pos_end = None
+  context = None
+
   def __init__(self):
-    self.set_pos()
-    self.set_context()
+    pass
+
+  def located(self, pos_start, pos_end, context):
+    return self.copy().set_pos(pos_start, pos_end).set_context(context)
 
   def set_pos(self, pos_start=None, pos_end=None):
     self.pos_start = pos_start
@@ -1365,8 +1844,8 @@ class Value:
   def notted(self, other):
     return None, self.illegal_operation(other)
 
-  def execute(self, args):
-    return RTResult().failure(self.illegal_operation())
+  def execute(self, args, context, pos_start, pos_end):
+    return RTResult().failure(self.located(pos_start, pos_end, context).illegal_operation())
 
   def copy(self):
     raise Exception('No copy method defined')
@@ -1374,6 +1853,10 @@ class Value:
   def is_true(self):
     return False
 
+  # Returns a Python iterator over the values a for-each loop binds
+  def iterated(self):
+    return None, self.illegal_operation()
+
   def illegal_operation(self, other=None):
     if not other: other = self
     return RTError(
@@ -1387,21 +1870,32 @@ class Number(Value):
     super().__init__()
     self.value = value
 
+  # Small integers are shared instead of allocated for every result
+  @staticmethod
+  def of(value):
+    if type(value) is int and SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+      return Number.small_ints[value - SMALL_INT_MIN]
+    return Number(value)
+
+  # Literals loaded from the program cache are interned again
+  def __reduce__(self):
+    return (Number.of, (self.value,))
+
   def added_to(self, other):
     if isinstance(other, Number):
-      return Number(self.value + other.value).set_context(self.context), None
+      return Number.of(self.value + other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def subbed_by(self, other):
     if isinstance(other, Number):
-      return Number(self.value - other.value).set_context(self.context), None
+      return Number.of(self.value - other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def multed_by(self, other):
     if isinstance(other, Number):
-      return Number(self.value * other.value).set_context(self.context), None
+      return Number.of(self.value * other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
@@ -1414,66 +1908,66 @@ class Number(Value):
           self.context
         )
 
-      return Number(self.value / other.value).set_context(self.context), None
+      return Number.of(self.value / other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def powed_by(self, other):
     if isinstance(other, Number):
-      return Number(self.value ** other.value).set_context(self.context), None
+      return Number.of(self.value ** other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_eq(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value == other.value)).set_context(self.context), None
+      return (Number.true if self.value == other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_ne(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value != other.value)).set_context(self.context), None
+      return (Number.true if self.value != other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_lt(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value < other.value)).set_context(self.context), None
+      return (Number.true if self.value < other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_gt(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value > other.value)).set_context(self.context), None
+      return (Number.true if self.value > other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_lte(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value <= other.value)).set_context(self.context), None
+      return (Number.true if self.value <= other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def get_comparison_gte(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value >= other.value)).set_context(self.context), None
+      return (Number.true if self.value >= other.value else Number.false), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def anded_by(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value and other.value)).set_context(self.context), None
+      return Number.of(int(self.value and other.value)), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def ored_by(self, other):
     if isinstance(other, Number):
-      return Number(int(self.value or other.value)).set_context(self.context), None
+      return Number.of(int(self.value or other.value)), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def notted(self):
-    return Number(1 if self.value == 0 else 0).set_context(self.context), None
+    return (Number.true if self.value == 0 else Number.false), None
 
   def copy(self):
     copy = Number(self.value)
@@ -1490,9 +1984,14 @@ class Number(Value):
   def __repr__(self):
     return str(self.value)
 
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 1024
+
+Number.small_ints = [Number(i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
 Number.null = Number(0)
-Number.false = Number(0)
-Number.true = Number(1)
+Number.false = Number.of(0)
+Number.true = Number.of(1)
+Number.minus_one = Number.of(-1)
 Number.math_PI = Number(math.pi)
 
 class String(Value):
@@ -1502,19 +2001,22 @@ class String(Value):
 
   def added_to(self, other):
     if isinstance(other, String):
-      return String(self.value + other.value).set_context(self.context), None
+      return String(self.value + other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def multed_by(self, other):
     if isinstance(other, Number):
-      return String(self.value * other.value).set_context(self.context), None
+      return String(self.value * other.value), None
     else:
       return None, Value.illegal_operation(self, other)
 
   def is_true(self):
     return len(self.value) > 0
 
+  def iterated(self):
+    return map(String, self.value), None
+
   def copy(self):
     copy = String(self.value)
     copy.set_pos(self.pos_start, self.pos_end)
@@ -1527,21 +2029,63 @@ class String(Value):
   def __repr__(self):
     return f'"{self.value}"'
 
+# Lists have value semantics for +, - and *, which build a new list and never
+# change their operands; only APPEND, POP and EXTEND change a list in place.
+# A List is a view of the first `length` items of a buffer that other lists
+# may share. Growing the view that ends where its buffer ends appends to the
+# buffer in place, so PLUH l = l + x in a loop costs amortized O(1) per item;
+# any other change takes a private copy of a shared buffer first.
 class List(Value):
-  def __init__(self, elements):
+  def __init__(self, elements, length=None):
     super().__init__()
-    self.elements = elements
+    self.buffer = elements
+    self.length = len(elements) if length is None else length
+    self.shared = False
+
+  @property
+  def elements(self):
+    if len(self.buffer) == self.length:
+      return self.buffer
+    return self.buffer[:self.length]
+
+  def share(self):
+    self.shared = True
+    new_list = List(self.buffer, self.length)
+    new_list.shared = True
+    return new_list
+
+  def append(self, value):
+    if len(self.buffer) != self.length:
+      self.buffer = self.buffer[:self.length]
+      self.shared = False
+    self.buffer.append(value)
+    self.length += 1
+
+  def extend(self, values):
+    if len(self.buffer) != self.length:
+      self.buffer = self.buffer[:self.length]
+      self.shared = False
+    self.buffer.extend(values)
+    self.length = len(self.buffer)
+
+  def pop(self, index):
+    if self.shared:
+      self.buffer = self.buffer[:self.length]
+      self.shared = False
+    element = self.buffer.pop(index)
+    self.length -= 1
+    return element
 
   def added_to(self, other):
-    new_list = self.copy()
-    new_list.elements.append(other)
+    new_list = self.share()
+    new_list.append(other)
     return new_list, None
 
   def subbed_by(self, other):
     if isinstance(other, Number):
-      new_list = self.copy()
+      new_list = self.share()
       try:
-        new_list.elements.pop(other.value)
+        new_list.pop(other.value)
         return new_list, None
       except:
         return None, RTError(
@@ -1554,27 +2098,33 @@ class List(Value):
 
   def multed_by(self, other):
     if isinstance(other, List):
-      new_list = self.copy()
-      new_list.elements.extend(other.elements)
+      new_list = self.share()
+      new_list.extend(other.elements)
       return new_list, None
     else:
       return None, Value.illegal_operation(self, other)
 
   def dived_by(self, other):
     if isinstance(other, Number):
-      try:
-        return self.elements[other.value], None
-      except:
-        return None, RTError(
-          other.pos_start, other.pos_end,
-          'Element at this index could not be retrieved from list because index is out of bounds',
-          self.context
-        )
+      index = other.value
+      if type(index) is int and -self.length <= index < self.length:
+        return self.buffer[index if index >= 0 else index + self.length], None
+
+      return None, RTError(
+        other.pos_start, other.pos_end,
+        'Element at this index could not be retrieved from list because index is out of bounds',
+        self.context
+      )
     else:
       return None, Value.illegal_operation(self, other)
+
+  # A loop sees the items the list had when it started, even if its body
+  # appends to the list
+  def iterated(self):
+    return itertools.islice(self.buffer, self.length), None
   
   def copy(self):
-    copy = List(self.elements)
+    copy = self.share()
     copy.set_pos(self.pos_start, self.pos_end)
     copy.set_context(self.context)
     return copy
@@ -1585,72 +2135,218 @@ class List(Value):
   def __repr__(self):
     return f'[{", ".join([repr(x) for x in self.elements])}]'
 
+# Vectors use NumPy when it is installed, unless ZINGO_NUMPY=0
+USE_NUMPY = numpy is not None and os.environ.get('ZINGO_NUMPY', '1') != '0'
+
+# An immutable list of numbers stored unboxed, as a float64 NumPy array or an
+# array('d'). The vector builtins (SUM, MAP_ADD, DOT, SORT) work on the whole
+# array in C instead of going through a Number per element, and also take a
+# RANGE. VECTOR and TO_LIST convert between vectors and lists.
+class Vector(Value):
+  def __init__(self, data):
+    super().__init__()
+    self.data = data
+
+  @staticmethod
+  def of(values):
+    if USE_NUMPY:
+      return Vector(numpy.fromiter(values, dtype=numpy.float64))
+    return Vector(array.array('d', values))
+
+  def sum(self):
+    if USE_NUMPY:
+      return float(numpy.sum(self.data))
+    return math.fsum(self.data)
+
+  def added_to_number(self, value):
+    if USE_NUMPY:
+      return Vector(self.data + value)
+    return Vector(array.array('d', map(float(value).__add__, self.data)))
+
+  def added_to_vector(self, other):
+    if USE_NUMPY:
+      return Vector(self.data + other.data)
+    return Vector(array.array('d', map(operator.add, self.data, other.data)))
+
+  def dot(self, other):
+    if USE_NUMPY:
+      return float(numpy.dot(self.data, other.data))
+    return math.fsum(map(operator.mul, self.data, other.data))
+
+  def sorted(self):
+    if USE_NUMPY:
+      return Vector(numpy.sort(self.data))
+    return Vector(array.array('d', sorted(self.data)))
+
+  @staticmethod
+  def range(start, end):
+    if USE_NUMPY:
+      return Vector(numpy.arange(start, end, dtype=numpy.float64))
+    count = max(0, math.ceil(end - start))
+    return Vector(array.array('d', map(start.__add__, range(count))))
+
+  def dived_by(self, other):
+    if isinstance(other, Number):
+      index = other.value
+      if type(index) is int and -len(self.data) <= index < len(self.data):
+        return Number(float(self.data[index])), None
+
+      return None, RTError(
+        other.pos_start, other.pos_end,
+        'Element at this index could not be retrieved from vector because index is out of bounds',
+        self.context
+      )
+    else:
+      return None, Value.illegal_operation(self, other)
+
+  def iterated(self):
+    return map(Number, self.data.tolist()), None
+
+  def copy(self):
+    copy = Vector(self.data)
+    copy.set_pos(self.pos_start, self.pos_end)
+    copy.set_context(self.context)
+    return copy
+
+  def __str__(self):
+    return ", ".join([str(x) for x in self.data.tolist()])
+
+  def __repr__(self):
+    return f'vector[{", ".join([str(x) for x in self.data.tolist()])}]'
+
+# The numbers from start up to, but not including, end, one apart. A range
+# never stores them: loops count through it, indexing computes the element,
+# and the vector builtins turn it into a Vector when they need the numbers.
+class Range(Value):
+  def __init__(self, start, end):
+    super().__init__()
+    self.start = start
+    self.end = end
+    self.length = max(0, math.ceil(end - start))
+
+  def to_vector(self):
+    return Vector.range(self.start, self.end)
+
+  def dived_by(self, other):
+    if isinstance(other, Number):
+      index = other.value
+      if type(index) is int and -self.length <= index < self.length:
+        return Number.of(self.start + (index if index >= 0 else index + self.length)), None
+
+      return None, RTError(
+        other.pos_start, other.pos_end,
+        'Element at this index could not be retrieved from range because index is out of bounds',
+        self.context
+      )
+    else:
+      return None, Value.illegal_operation(self, other)
+
+  def iterated(self):
+    return map(Number.of, map(self.start.__add__, range(self.length))), None
+
+  def is_true(self):
+    return self.length > 0
+
+  def copy(self):
+    copy = Range(self.start, self.end)
+    copy.set_pos(self.pos_start, self.pos_end)
+    copy.set_context(self.context)
+    return copy
+
+  def __str__(self):
+    return f'RANGE({self.start}, {self.end})'
+
+  def __repr__(self):
+    return f'RANGE({self.start}, {self.end})'
+
 class BaseFunction(Value):
   def __init__(self, name):
     super().__init__()
     self.name = name or "<anonymous>"
 
-  def generate_new_context(self):
-    new_context = Context(self.name, self.context, self.pos_start)
+  # context and pos_start describe the call site the function is entered from
+  def generate_new_context(self, context, pos_start):
+    new_context = Context(self.name, context, pos_start)
     new_context.symbol_table = SymbolTable(new_context.parent.symbol_table)
     return new_context
 
-  def check_args(self, arg_names, args):
+  def check_args(self, arg_names, args, context, pos_start, pos_end):
     res = RTResult()
 
     if len(args) > len(arg_names):
       return res.failure(RTError(
-        self.pos_start, self.pos_end,
+        pos_start, pos_end,
         f"{len(args) - len(arg_names)} too many args passed into {self}",
-        self.context
+        context
       ))
     
     if len(args) < len(arg_names):
       return res.failure(RTError(
-        self.pos_start, self.pos_end,
+        pos_start, pos_end,
         f"{len(arg_names) - len(args)} too few args passed into {self}",
-        self.context
+        context
       ))
 
     return res.success(None)
 
   def populate_args(self, arg_names, args, exec_ctx):
     for i in range(len(args)):
-      arg_name = arg_names[i]
-      arg_value = args[i]
-      arg_value.set_context(exec_ctx)
-      exec_ctx.symbol_table.set(arg_name, arg_value)
+      exec_ctx.symbol_table.set(arg_names[i], args[i])
 
-  def check_and_populate_args(self, arg_names, args, exec_ctx):
+  def check_and_populate_args(self, arg_names, args, exec_ctx, pos_end):
     res = RTResult()
-    res.register(self.check_args(arg_names, args))
+    res.register(self.check_args(arg_names, args, exec_ctx.parent, exec_ctx.parent_entry_pos, pos_end))
     if res.should_return(): return res
     self.populate_args(arg_names, args, exec_ctx)
     return res.success(None)
 
 class Function(BaseFunction):
-  def __init__(self, name, body_node, arg_names, should_auto_return):
+  def __init__(self, name, body_node, arg_names, should_auto_return, body_code=None, scope=None):
     super().__init__(name)
     self.body_node = body_node
     self.arg_names = arg_names
     self.should_auto_return = should_auto_return
+    self.body_code = body_code
+    self.scope = scope
 
-  def execute(self, args):
+  def generate_new_context(self, context, pos_start):
+    if not self.scope: return super().generate_new_context(context, pos_start)
+    new_context = Context(self.name, context, pos_start)
+    new_context.symbol_table = Frame(self.scope, new_context.parent.symbol_table)
+    return new_context
+
+  def execute(self, args, context, pos_start, pos_end):
+    meter = run_state.meter
+    if meter is None:
+      return self.call(args, context, pos_start, pos_end)
+
+    error = meter.step(pos_start, pos_end, context) or meter.enter(pos_start, pos_end, context)
+    if error: return RTResult().failure(error)
+
+    try:
+      return self.call(args, context, pos_start, pos_end)
+    finally:
+      meter.depth -= 1
+
+  def call(self, args, context, pos_start, pos_end):
     res = RTResult()
-    interpreter = Interpreter()
-    exec_ctx = self.generate_new_context()
+    exec_ctx = self.generate_new_context(context, pos_start)
 
-    res.register(self.check_and_populate_args(self.arg_names, args, exec_ctx))
+    res.register(self.check_and_populate_args(self.arg_names, args, exec_ctx, pos_end))
     if res.should_return(): return res
 
-    value = res.register(interpreter.visit(self.body_node, exec_ctx))
+    # Functions created by the Compiler carry their pre-compiled body
+    if self.body_code:
+      value = res.register(self.body_code(exec_ctx))
+    else:
+      value = res.register(Interpreter().visit(self.body_node, exec_ctx))
     if res.should_return() and res.func_return_value == None: return res
 
     ret_value = (value if self.should_auto_return else None) or res.func_return_value or Number.null
     return res.success(ret_value)
 
   def copy(self):
-    copy = Function(self.name, self.body_node, self.arg_names, self.should_auto_return)
+    copy = Function(self.name, self.body_node, self.arg_names, self.should_auto_return, self.body_code, self.scope)
     copy.set_context(self.context)
     copy.set_pos(self.pos_start, self.pos_end)
     return copy
@@ -1662,14 +2358,16 @@ class BuiltInFunction(BaseFunction):
   def __init__(self, name):
     super().__init__(name)
 
-  def execute(self, args):
+  def execute(self, args, context, pos_start, pos_end):
     res = RTResult()
-    exec_ctx = self.generate_new_context()
+    exec_ctx = self.generate_new_context(context, pos_start)
 
+    # The execute_* methods report errors at the builtin's own position
+    located = self.located(pos_start, pos_end, context)
     method_name = f'execute_{self.name}'
-    method = getattr(self, method_name, self.no_visit_method)
+    method = getattr(located, method_name, self.no_visit_method)
 
-    res.register(self.check_and_populate_args(method.arg_names, args, exec_ctx))
+    res.register(self.check_and_populate_args(method.arg_names, args, exec_ctx, pos_end))
     if res.should_return(): return res
 
     return_value = res.register(method(exec_ctx))
@@ -1691,7 +2389,12 @@ class BuiltInFunction(BaseFunction):
   #####################################
 
   def execute_print(self, exec_ctx):
-    print(str(exec_ctx.symbol_table.get('value')))
+    text = str(exec_ctx.symbol_table.get('value'))
+    output = run_state.output
+    if output is None:
+      print(text)
+    else:
+      output.append(text)
     return RTResult().success(Number.null)
   execute_print.arg_names = ['value']
   
@@ -1712,7 +2415,7 @@ class BuiltInFunction(BaseFunction):
         break
       except ValueError:
         print(f"'{text}' must be an integer. Try again!")
-    return RTResult().success(Number(number))
+    return RTResult().success(Number.of(number))
   execute_input_int.arg_names = []
 
   def execute_clear(self, exec_ctx):
@@ -1751,7 +2454,7 @@ class BuiltInFunction(BaseFunction):
         exec_ctx
       ))
 
-    list_.elements.append(value)
+    list_.append(value)
     return RTResult().success(Number.null)
   execute_append.arg_names = ["list", "value"]
 
@@ -1774,7 +2477,7 @@ class BuiltInFunction(BaseFunction):
       ))
 
     try:
-      element = list_.elements.pop(index.value)
+      element = list_.pop(index.value)
     except:
       return RTResult().failure(RTError(
         self.pos_start, self.pos_end,
@@ -1802,13 +2505,19 @@ class BuiltInFunction(BaseFunction):
         exec_ctx
       ))
 
-    listA.elements.extend(listB.elements)
+    listA.extend(listB.elements)
     return RTResult().success(Number.null)
   execute_extend.arg_names = ["listA", "listB"]
 
   def execute_len(self, exec_ctx):
     list_ = exec_ctx.symbol_table.get("list")
 
+    if isinstance(list_, Vector):
+      return RTResult().success(Number.of(len(list_.data)))
+
+    if isinstance(list_, Range):
+      return RTResult().success(Number.of(list_.length))
+
     if not isinstance(list_, List):
       return RTResult().failure(RTError(
         self.pos_start, self.pos_end,
@@ -1816,7 +2525,7 @@ class BuiltInFunction(BaseFunction):
         exec_ctx
       ))
 
-    return RTResult().success(Number(len(list_.elements)))
+    return RTResult().success(Number.of(list_.length))
   execute_len.arg_names = ["list"]
 
   def execute_run(self, exec_ctx):
@@ -1832,8 +2541,7 @@ class BuiltInFunction(BaseFunction):
     fn = fn.value
 
     try:
-      with open(fn, "r") as f:
-        script = f.read()
+      node, error = load_program(fn)
     except Exception as e:
       return RTResult().failure(RTError(
         self.pos_start, self.pos_end,
@@ -1841,8 +2549,18 @@ class BuiltInFunction(BaseFunction):
         exec_ctx
       ))
 
-    _, error = run(fn, script)
-    
+    # The script shares the global scope of the program that runs it
+    root = exec_ctx
+    while root.parent:
+      root = root.parent
+    context = Context('<program>')
+    context.symbol_table = root.symbol_table
+
+    # The script runs like the program that started it, and its steps count
+    # against the same budget since run_program keeps the current meter
+    if not error:
+      _, error = run_program(node, context, run_state.engine, run_state.optimize)
+
     if error:
       return RTResult().failure(RTError(
         self.pos_start, self.pos_end,
@@ -1865,7 +2583,7 @@ class BuiltInFunction(BaseFunction):
     if isinstance(value, String):
         try:
             num = int(value.value)
-            return RTResult().success(Number(num))
+            return RTResult().success(Number.of(num))
         except ValueError:
             return RTResult().failure(RTError(
                 self.pos_start, self.pos_end,
@@ -1880,6 +2598,122 @@ class BuiltInFunction(BaseFunction):
     ))
   execute_int.arg_names = ["value"]
 
+  def vector_arg(self, exec_ctx, name, ordinal):
+    value = exec_ctx.symbol_table.get(name)
+    if isinstance(value, Vector): return value, None
+    if isinstance(value, Range): return value.to_vector(), None
+
+    return None, RTError(
+      self.pos_start, self.pos_end,
+      f"{ordinal} argument must be vector",
+      exec_ctx
+    )
+
+  def execute_vector(self, exec_ctx):
+    list_ = exec_ctx.symbol_table.get("list")
+
+    if not isinstance(list_, List):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "Argument must be list",
+        exec_ctx
+      ))
+
+    elements = list_.elements
+    if not all(isinstance(element, Number) for element in elements):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "List must only contain numbers",
+        exec_ctx
+      ))
+
+    return RTResult().success(Vector.of(element.value for element in elements))
+  execute_vector.arg_names = ["list"]
+
+  def execute_to_list(self, exec_ctx):
+    value = exec_ctx.symbol_table.get("vector")
+
+    if not isinstance(value, (Vector, Range)):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "First argument must be vector or range",
+        exec_ctx
+      ))
+
+    iterator, _ = value.iterated()
+    return RTResult().success(List(list(iterator)))
+  execute_to_list.arg_names = ["vector"]
+
+  def execute_sum(self, exec_ctx):
+    vector, error = self.vector_arg(exec_ctx, "vector", "First")
+    if error: return RTResult().failure(error)
+    return RTResult().success(Number(vector.sum()))
+  execute_sum.arg_names = ["vector"]
+
+  def execute_map_add(self, exec_ctx):
+    vector, error = self.vector_arg(exec_ctx, "vector", "First")
+    if error: return RTResult().failure(error)
+    value = exec_ctx.symbol_table.get("value")
+
+    if isinstance(value, Number):
+      return RTResult().success(vector.added_to_number(value.value))
+
+    if isinstance(value, Range):
+      value = value.to_vector()
+
+    if not isinstance(value, Vector):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "Second argument must be number or vector",
+        exec_ctx
+      ))
+
+    if len(value.data) != len(vector.data):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "Vectors must have the same length",
+        exec_ctx
+      ))
+
+    return RTResult().success(vector.added_to_vector(value))
+  execute_map_add.arg_names = ["vector", "value"]
+
+  def execute_dot(self, exec_ctx):
+    vectorA, error = self.vector_arg(exec_ctx, "vectorA", "First")
+    if error: return RTResult().failure(error)
+    vectorB, error = self.vector_arg(exec_ctx, "vectorB", "Second")
+    if error: return RTResult().failure(error)
+
+    if len(vectorA.data) != len(vectorB.data):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "Vectors must have the same length",
+        exec_ctx
+      ))
+
+    return RTResult().success(Number(vectorA.dot(vectorB)))
+  execute_dot.arg_names = ["vectorA", "vectorB"]
+
+  def execute_range(self, exec_ctx):
+    start = exec_ctx.symbol_table.get("start")
+    end = exec_ctx.symbol_table.get("end")
+
+    if not isinstance(start, Number) or not isinstance(end, Number):
+      return RTResult().failure(RTError(
+        self.pos_start, self.pos_end,
+        "Arguments must be numbers",
+        exec_ctx
+      ))
+
+    return RTResult().success(Range(start.value, end.value))
+  execute_range.arg_names = ["start", "end"]
+
+  def execute_sort(self, exec_ctx):
+    vector, error = self.vector_arg(exec_ctx, "vector", "First")
+    if error: return RTResult().failure(error)
+    return RTResult().success(vector.sorted())
+  execute_sort.arg_names = ["vector"]
+
 
 BuiltInFunction.print       = BuiltInFunction("print")
 BuiltInFunction.print_ret   = BuiltInFunction("print_ret")
@@ -1896,6 +2730,13 @@ BuiltInFunction.extend      = BuiltInFunction("extend")
 BuiltInFunction.len					= BuiltInFunction("len")
 BuiltInFunction.run					= BuiltInFunction("run")
 BuiltInFunction.int         = BuiltInFunction("int")
+BuiltInFunction.vector      = BuiltInFunction("vector")
+BuiltInFunction.to_list     = BuiltInFunction("to_list")
+BuiltInFunction.sum         = BuiltInFunction("sum")
+BuiltInFunction.map_add     = BuiltInFunction("map_add")
+BuiltInFunction.dot         = BuiltInFunction("dot")
+BuiltInFunction.range       = BuiltInFunction("range")
+BuiltInFunction.sort        = BuiltInFunction("sort")
 
 #######################################
 # CONTEXT
@@ -1929,10 +2770,128 @@ class SymbolTable:
   def remove(self, name):
     del self.symbols[name]
 
+# Builtins are shared by every program, so once populated this table is frozen
+# and assignments land in a per-run SymbolTable layered on top of it.
+class BuiltinSymbolTable(SymbolTable):
+  frozen = False
+
+  def freeze(self):
+    self.frozen = True
+
+  def set(self, name, value):
+    if self.frozen:
+      raise Exception(f"Builtin '{name}' can't be rebound")
+    super().set(name, value)
+
+  def remove(self, name):
+    raise Exception(f"Builtin '{name}' can't be removed")
+
+# The global scope of one run. Every global name gets a fixed slot the first
+# time it is set or compiled, so compiled top-level code reads and writes
+# globals by index; an empty slot falls back to the builtins, which a script
+# can shadow just by assigning the name. bound_names holds every name that a
+# Frame running on top of this table binds locally, since Zingo functions see
+# their callers' variables and such a name may hide the global.
+class GlobalTable(SymbolTable):
+  def __init__(self, parent=None):
+    super().__init__(parent)
+    self.slots = []
+    self.index = {}
+    self.scopes = set()
+    self.bound_names = set()
+
+  def slot(self, name):
+    index = self.index.get(name)
+    if index is None:
+      index = self.index[name] = len(self.slots)
+      self.slots.append(None)
+    return index
+
+  def get(self, name):
+    index = self.index.get(name)
+    value = self.slots[index] if index is not None else None
+    if value == None and self.parent:
+      return self.parent.get(name)
+    return value
+
+  def set(self, name, value):
+    self.slots[self.slot(name)] = value
+
+  def remove(self, name):
+    index = self.index.get(name)
+    if index is None or self.slots[index] is None:
+      raise KeyError(name)
+    self.slots[index] = None
+
+  def bind(self, scope):
+    self.scopes.add(scope)
+    self.bound_names.update(scope.names)
+
+# The symbol table of a compiled function call. Names the Resolver found in
+# the function's Scope live in a fixed array of slots; anything else a caller
+# sets from outside goes to the regular symbols dict. globals is the
+# GlobalTable the call stack starts from, or None when a table that isn't a
+# Frame sits in between and lookups have to walk the whole chain.
+class Frame(SymbolTable):
+  def __init__(self, scope, parent=None):
+    super().__init__(parent)
+    self.scope = scope
+    self.slots = [None] * len(scope.names)
+
+    if isinstance(parent, Frame):
+      self.globals = parent.globals
+    elif isinstance(parent, GlobalTable):
+      self.globals = parent
+    else:
+      self.globals = None
+
+    if self.globals is not None and scope not in self.globals.scopes:
+      self.globals.bind(scope)
+
+  def get(self, name):
+    index = self.scope.index.get(name)
+    value = self.slots[index] if index is not None else self.symbols.get(name, None)
+    if value == None and self.parent:
+      return self.parent.get(name)
+    return value
+
+  def set(self, name, value):
+    index = self.scope.index.get(name)
+    if index is None:
+      if self.globals is not None:
+        self.globals.bound_names.add(name)
+      self.symbols[name] = value
+    else:
+      self.slots[index] = value
+
+  def remove(self, name):
+    index = self.scope.index.get(name)
+    if index is None:
+      del self.symbols[name]
+    else:
+      self.slots[index] = None
+
 #######################################
 # INTERPRETER
 #######################################
 
+# The values a FOR loop's counter takes. Integer loops count on a C-level
+# range; anything else steps in Python, and a zero step never ends.
+def count_loop(start, end, step):
+  if type(start) is int and type(end) is int and type(step) is int and step != 0:
+    return range(start, end, step)
+  return count_by(start, end, step)
+
+def count_by(i, end, step):
+  if step >= 0:
+    while i < end:
+      yield i
+      i += step
+  else:
+    while i > end:
+      yield i
+      i += step
+
 class Interpreter:
   def visit(self, node, context):
     method_name = f'visit_{type(node).__name__}'
@@ -1945,14 +2904,10 @@ class Interpreter:
   ###################################
 
   def visit_NumberNode(self, node, context):
-    return RTResult().success(
-      Number(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end)
-    )
+    return RTResult().success(node.value)
 
   def visit_StringNode(self, node, context):
-    return RTResult().success(
-      String(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end)
-    )
+    return RTResult().success(node.value)
 
   def visit_ListNode(self, node, context):
     res = RTResult()
@@ -1962,9 +2917,7 @@ class Interpreter:
       elements.append(res.register(self.visit(element_node, context)))
       if res.should_return(): return res
 
-    return res.success(
-      List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
-    )
+    return res.success(List(elements))
 
   def visit_VarAccessNode(self, node, context):
     res = RTResult()
@@ -1978,7 +2931,6 @@ class Interpreter:
         context
       ))
 
-    value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
     return res.success(value)
 
   def visit_VarAssignNode(self, node, context):
@@ -1992,59 +2944,80 @@ class Interpreter:
 
   def visit_BinOpNode(self, node, context):
     res = RTResult()
-    left = res.register(self.visit(node.left_node, context))
-    if res.should_return(): return res
-    right = res.register(self.visit(node.right_node, context))
+    first_node, chain = bin_op_chain(node)
+    left = res.register(self.visit(first_node, context))
     if res.should_return(): return res
 
-    if node.op_tok.type == TT_PLUS:
+    for node in chain:
+      right = res.register(self.visit(node.right_node, context))
+      if res.should_return(): return res
+
+      result, error = self.operate(node.op_tok, left, right)
+
+      if error:
+        # Re-run the failed operation on located operands to build the error
+        left = left.located(node.left_node.pos_start, node.left_node.pos_end, context)
+        right = right.located(node.right_node.pos_start, node.right_node.pos_end, context)
+        _, error = self.operate(node.op_tok, left, right)
+        return res.failure(error)
+
+      left = result
+
+    return res.success(left)
+
+  def operate(self, op_tok, left, right):
+    if op_tok.type == TT_PLUS:
       result, error = left.added_to(right)
-    elif node.op_tok.type == TT_MINUS:
+    elif op_tok.type == TT_MINUS:
       result, error = left.subbed_by(right)
-    elif node.op_tok.type == TT_MUL:
+    elif op_tok.type == TT_MUL:
       result, error = left.multed_by(right)
-    elif node.op_tok.type == TT_DIV:
+    elif op_tok.type == TT_DIV:
       result, error = left.dived_by(right)
-    elif node.op_tok.type == TT_POW:
+    elif op_tok.type == TT_POW:
       result, error = left.powed_by(right)
-    elif node.op_tok.type == TT_EE:
+    elif op_tok.type == TT_EE:
       result, error = left.get_comparison_eq(right)
-    elif node.op_tok.type == TT_NE:
+    elif op_tok.type == TT_NE:
       result, error = left.get_comparison_ne(right)
-    elif node.op_tok.type == TT_LT:
+    elif op_tok.type == TT_LT:
       result, error = left.get_comparison_lt(right)
-    elif node.op_tok.type == TT_GT:
+    elif op_tok.type == TT_GT:
       result, error = left.get_comparison_gt(right)
-    elif node.op_tok.type == TT_LTE:
+    elif op_tok.type == TT_LTE:
       result, error = left.get_comparison_lte(right)
-    elif node.op_tok.type == TT_GTE:
+    elif op_tok.type == TT_GTE:
       result, error = left.get_comparison_gte(right)
-    elif node.op_tok.matches(TT_KEYWORD, 'AND'):
+    elif op_tok.matches(TT_KEYWORD, 'AND'):
       result, error = left.anded_by(right)
-    elif node.op_tok.matches(TT_KEYWORD, 'OR'):
+    elif op_tok.matches(TT_KEYWORD, 'OR'):
       result, error = left.ored_by(right)
 
-    if error:
-      return res.failure(error)
-    else:
-      return res.success(result.set_pos(node.pos_start, node.pos_end))
+    return result, error
 
   def visit_UnaryOpNode(self, node, context):
     res = RTResult()
-    number = res.register(self.visit(node.node, context))
+    operand = res.register(self.visit(node.node, context))
     if res.should_return(): return res
 
-    error = None
-
-    if node.op_tok.type == TT_MINUS:
-      number, error = number.multed_by(Number(-1))
-    elif node.op_tok.matches(TT_KEYWORD, 'CAP'):
-      number, error = number.notted()
+    number, error = self.operate_unary(node.op_tok, operand)
 
     if error:
+      operand = operand.located(node.node.pos_start, node.node.pos_end, context)
+      _, error = self.operate_unary(node.op_tok, operand)
       return res.failure(error)
     else:
-      return res.success(number.set_pos(node.pos_start, node.pos_end))
+      return res.success(number)
+
+  def operate_unary(self, op_tok, number):
+    error = None
+
+    if op_tok.type == TT_MINUS:
+      number, error = number.multed_by(Number.minus_one)
+    elif op_tok.matches(TT_KEYWORD, 'CAP'):
+      number, error = number.notted()
+
+    return number, error
 
   def visit_IfNode(self, node, context):
     res = RTResult()
@@ -2068,7 +3041,6 @@ class Interpreter:
 
   def visit_ForNode(self, node, context):
     res = RTResult()
-    elements = []
 
     start_value = res.register(self.visit(node.start_value_node, context))
     if res.should_return(): return res
@@ -2080,40 +3052,72 @@ class Interpreter:
       step_value = res.register(self.visit(node.step_value_node, context))
       if res.should_return(): return res
     else:
-      step_value = Number(1)
+      step_value = Number.true
 
-    i = start_value.value
+    values = map(Number.of, count_loop(start_value.value, end_value.value, step_value.value))
+    return self.loop_over(node, values, context)
 
-    if step_value.value >= 0:
-      condition = lambda: i < end_value.value
-    else:
-      condition = lambda: i > end_value.value
-    
-    while condition():
-      context.symbol_table.set(node.var_name_tok.value, Number(i))
-      i += step_value.value
+  def visit_ForEachNode(self, node, context):
+    res = RTResult()
 
-      value = res.register(self.visit(node.body_node, context))
-      if res.should_return() and res.loop_should_continue == False and res.loop_should_break == False: return res
-      
-      if res.loop_should_continue:
-        continue
-      
-      if res.loop_should_break:
-        break
+    iterable = res.register(self.visit(node.iterable_node, context))
+    if res.should_return(): return res
+
+    values, error = iterable.iterated()
+
+    if error:
+      iterable = iterable.located(node.iterable_node.pos_start, node.iterable_node.pos_end, context)
+      _, error = iterable.iterated()
+      return res.failure(error)
+
+    return self.loop_over(node, values, context)
+
+  # Binds the loop variable of a FOR or for-each node to each of the values
+  # in turn and runs the body
+  def loop_over(self, node, values, context):
+    res = RTResult()
+    elements = []
+
+    var_name = node.var_name_tok.value
+    set_var = context.symbol_table.set
+    body_node = node.body_node
+    visit_body = getattr(self, f'visit_{type(body_node).__name__}', self.no_visit_method)
+    should_return_null = node.should_return_null
+    meter = run_state.meter
+
+    for value in values:
+      if meter is not None:
+        error = meter.step(node.pos_start, node.pos_end, context)
+        if error: return res.failure(error)
+
+      set_var(var_name, value)
+
+      # One check covers the common case; the loop flags are only
+      # looked at once the body has stopped early
+      value = res.register(visit_body(body_node, context))
+      if res.should_return():
+        if res.loop_should_continue: continue
+        if res.loop_should_break: break
+        return res
 
-      elements.append(value)
+      if not should_return_null:
+        elements.append(value)
 
     return res.success(
-      Number.null if node.should_return_null else
-      List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
+      Number.null if should_return_null else
+      List(elements)
     )
 
   def visit_WhileNode(self, node, context):
     res = RTResult()
     elements = []
+    meter = run_state.meter
 
     while True:
+      if meter is not None:
+        error = meter.step(node.pos_start, node.pos_end, context)
+        if error: return res.failure(error)
+
       condition = res.register(self.visit(node.condition_node, context))
       if res.should_return(): return res
 
@@ -2129,11 +3133,12 @@ class Interpreter:
       if res.loop_should_break:
         break
 
-      elements.append(value)
+      if not node.should_return_null:
+        elements.append(value)
 
     return res.success(
       Number.null if node.should_return_null else
-      List(elements).set_context(context).set_pos(node.pos_start, node.pos_end)
+      List(elements)
     )
 
   def visit_FuncDefNode(self, node, context):
@@ -2142,7 +3147,7 @@ class Interpreter:
     func_name = node.var_name_tok.value if node.var_name_tok else None
     body_node = node.body_node
     arg_names = [arg_name.value for arg_name in node.arg_name_toks]
-    func_value = Function(func_name, body_node, arg_names, node.should_auto_return).set_context(context).set_pos(node.pos_start, node.pos_end)
+    func_value = Function(func_name, body_node, arg_names, node.should_auto_return)
     
     if node.var_name_tok:
       context.symbol_table.set(func_name, func_value)
@@ -2155,15 +3160,13 @@ class Interpreter:
 
     value_to_call = res.register(self.visit(node.node_to_call, context))
     if res.should_return(): return res
-    value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
 
     for arg_node in node.arg_nodes:
       args.append(res.register(self.visit(arg_node, context)))
       if res.should_return(): return res
 
-    return_value = res.register(value_to_call.execute(args))
+    return_value = res.register(value_to_call.execute(args, context, node.pos_start, node.pos_end))
     if res.should_return(): return res
-    return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
     return res.success(return_value)
 
   def visit_ReturnNode(self, node, context):
@@ -2183,44 +3186,1294 @@ class Interpreter:
   def visit_BreakNode(self, node, context):
     return RTResult().success_break()
 
+#######################################
+# RESOLVER
+#######################################
+
+# The local variables of one function body, each with a fixed slot index.
+# Zingo functions see the variables of whoever called them, so a name that
+# is not local is only read from its global slot while no function running
+# on the same GlobalTable binds it (see GlobalTable.bound_names).
+class Scope:
+  def __init__(self, names):
+    self.names = names
+    self.index = {name: i for i, name in enumerate(names)}
+
+  def slot(self, name):
+    return self.index.get(name)
+
+# Collects the names a function binds: its arguments, assigned variables,
+# FOR loop variables and named inner functions (whose bodies get their own
+# Scope when they are compiled).
+class Resolver:
+  def resolve(self, func_def_node):
+    self.names = [arg_name.value for arg_name in func_def_node.arg_name_toks]
+    self.visit(func_def_node.body_node)
+    return Scope(self.names)
+
+  def bind(self, name):
+    if name not in self.names:
+      self.names.append(name)
+
+  def visit(self, node):
+    method_name = f'visit_{type(node).__name__}'
+    method = getattr(self, method_name, self.no_visit_method)
+    method(node)
+
+  def no_visit_method(self, node):
+    raise Exception(f'No visit_{type(node).__name__} method defined')
+
+  ###################################
+
+  def visit_NumberNode(self, node): pass
+  def visit_StringNode(self, node): pass
+  def visit_VarAccessNode(self, node): pass
+  def visit_ContinueNode(self, node): pass
+  def visit_BreakNode(self, node): pass
+
+  def visit_ListNode(self, node):
+    for element_node in node.element_nodes:
+      self.visit(element_node)
+
+  def visit_VarAssignNode(self, node):
+    self.visit(node.value_node)
+    self.bind(node.var_name_tok.value)
+
+  def visit_BinOpNode(self, node):
+    first_node, chain = bin_op_chain(node)
+    self.visit(first_node)
+    for node in chain:
+      self.visit(node.right_node)
+
+  def visit_UnaryOpNode(self, node):
+    self.visit(node.node)
+
+  def visit_IfNode(self, node):
+    for condition, expr, _ in node.cases:
+      self.visit(condition)
+      self.visit(expr)
+    if node.else_case:
+      self.visit(node.else_case[0])
+
+  def visit_ForNode(self, node):
+    self.bind(node.var_name_tok.value)
+    self.visit(node.start_value_node)
+    self.visit(node.end_value_node)
+    if node.step_value_node:
+      self.visit(node.step_value_node)
+    self.visit(node.body_node)
+
+  def visit_ForEachNode(self, node):
+    self.bind(node.var_name_tok.value)
+    self.visit(node.iterable_node)
+    self.visit(node.body_node)
+
+  def visit_WhileNode(self, node):
+    self.visit(node.condition_node)
+    self.visit(node.body_node)
+
+  def visit_FuncDefNode(self, node):
+    if node.var_name_tok:
+      self.bind(node.var_name_tok.value)
+
+  def visit_CallNode(self, node):
+    self.visit(node.node_to_call)
+    for arg_node in node.arg_nodes:
+      self.visit(arg_node)
+
+  def visit_ReturnNode(self, node):
+    if node.node_to_return:
+      self.visit(node.node_to_return)
+
+#######################################
+# COMPILER
+#######################################
+
+BINARY_OPS = {
+  TT_PLUS: 'added_to',
+  TT_MINUS: 'subbed_by',
+  TT_MUL: 'multed_by',
+  TT_DIV: 'dived_by',
+  TT_POW: 'powed_by',
+  TT_EE: 'get_comparison_eq',
+  TT_NE: 'get_comparison_ne',
+  TT_LT: 'get_comparison_lt',
+  TT_GT: 'get_comparison_gt',
+  TT_LTE: 'get_comparison_lte',
+  TT_GTE: 'get_comparison_gte',
+  'AND': 'anded_by',
+  'OR': 'ored_by',
+}
+
+# Whether running node can cut short the iteration of a loop around it: a
+# BREAK or CONTINUE of its own, or one escaping a function it calls. Nested
+# loops catch whatever their own body raises, but not their header.
+def may_exit_loop(node):
+  if isinstance(node, (BreakNode, ContinueNode, CallNode)):
+    return True
+  if isinstance(node, ListNode):
+    return any(may_exit_loop(element_node) for element_node in node.element_nodes)
+  if isinstance(node, VarAssignNode):
+    return may_exit_loop(node.value_node)
+  if isinstance(node, BinOpNode):
+    first_node, chain = bin_op_chain(node)
+    return may_exit_loop(first_node) or any(may_exit_loop(node.right_node) for node in chain)
+  if isinstance(node, UnaryOpNode):
+    return may_exit_loop(node.node)
+  if isinstance(node, IfNode):
+    return (
+      any(may_exit_loop(condition) or may_exit_loop(expr) for condition, expr, _ in node.cases) or
+      (node.else_case is not None and may_exit_loop(node.else_case[0]))
+    )
+  if isinstance(node, ForNode):
+    return any(
+      may_exit_loop(value_node)
+      for value_node in (node.start_value_node, node.end_value_node, node.step_value_node)
+      if value_node
+    )
+  if isinstance(node, ForEachNode):
+    return may_exit_loop(node.iterable_node)
+  if isinstance(node, WhileNode):
+    return may_exit_loop(node.condition_node)
+  if isinstance(node, ReturnNode):
+    return node.node_to_return is not None and may_exit_loop(node.node_to_return)
+  return False
+
+# Turns every node into a closure once, so running the program no longer
+# pays for the name-based visit_* dispatch of the Interpreter on each node.
+# Closures return plain values; errors and RETURN/CONTINUE/BREAK unwind as
+# signals, and compile_body() turns them back into an RTResult at the edge.
+# scope is the Scope of the function being compiled, or for top-level code
+# the GlobalTable it will run in, whose slots work the same way.
+class Compiler:
+  def __init__(self, scope=None):
+    self.scope = scope
+
+  def compile_body(self, node):
+    code = self.compile(node)
+
+    def body(context):
+      try:
+        return RTResult().success(code(context))
+      except ErrorSignal as signal:
+        return RTResult().failure(signal.error)
+      except ReturnSignal as signal:
+        return RTResult().success_return(signal.value)
+      except ContinueSignal:
+        return RTResult().success_continue()
+      except BreakSignal:
+        return RTResult().success_break()
+    return body
+
+  def compile(self, node):
+    method_name = f'compile_{type(node).__name__}'
+    method = getattr(self, method_name, self.no_compile_method)
+    return method(node)
+
+  def no_compile_method(self, node):
+    raise Exception(f'No compile_{type(node).__name__} method defined')
+
+  ###################################
+
+  def compile_NumberNode(self, node):
+    value = node.value
+
+    def number(context):
+      return value
+    return number
+
+  def compile_StringNode(self, node):
+    value = node.value
+
+    def string(context):
+      return value
+    return string
+
+  def compile_ListNode(self, node):
+    element_codes = [self.compile(element_node) for element_node in node.element_nodes]
+
+    def list_(context):
+      elements = []
+      for element_code in element_codes:
+        elements.append(element_code(context))
+      return List(elements)
+    return list_
+
+  def compile_VarAccessNode(self, node):
+    var_name = node.var_name_tok.value
+    index = self.scope.slot(var_name) if self.scope else None
+    pos_start, pos_end = node.pos_start, node.pos_end
+    # The GlobalTable free_access last ran on and the name's slot in it
+    global_slot = (None, None)
+
+    def var_access(context):
+      value = context.symbol_table.get(var_name)
+      return found(value, context)
+
+    # A local that has not been assigned yet still falls back to the caller,
+    # and an empty global slot to the builtins
+    def local_access(context):
+      table = context.symbol_table
+      value = table.slots[index]
+      if value is None:
+        value = table.parent.get(var_name)
+      return found(value, context)
+
+    # Only walk the callers when some function could be shadowing the name
+    def free_access(context):
+      nonlocal global_slot
+      table = context.symbol_table
+      globals_ = table.globals
+      if globals_ is None or var_name in globals_.bound_names:
+        return found(table.get(var_name), context)
+
+      seen, index = global_slot
+      if seen is not globals_:
+        index = globals_.slot(var_name)
+        global_slot = (globals_, index)
+
+      value = globals_.slots[index]
+      if value is None:
+        value = globals_.parent.get(var_name)
+      return found(value, context)
+
+    def found(value, context):
+      if not value:
+        raise ErrorSignal(RTError(
+          pos_start, pos_end,
+          f"'{var_name}' is not defined",
+          context
+        ))
+
+      return value
+
+    if not self.scope: return var_access
+    if index is not None: return local_access
+    return free_access
+
+  def compile_VarAssignNode(self, node):
+    var_name = node.var_name_tok.value
+    index = self.scope.slot(var_name) if self.scope else None
+    value_code = self.compile(node.value_node)
+
+    def var_assign(context):
+      value = value_code(context)
+      context.symbol_table.set(var_name, value)
+      return value
+
+    def local_assign(context):
+      value = value_code(context)
+      context.symbol_table.slots[index] = value
+      return value
+
+    return var_assign if index is None else local_assign
+
+  def compile_BinOpNode(self, node):
+    first_node, chain = bin_op_chain(node)
+    first_code = self.compile(first_node)
+    steps = [
+      (BINARY_OPS[node.op_tok.value if node.op_tok.type == TT_KEYWORD else node.op_tok.type], self.compile(node.right_node), node)
+      for node in chain
+    ]
+
+    def fail(left, right, op_name, node, context):
+      left = left.located(node.left_node.pos_start, node.left_node.pos_end, context)
+      right = right.located(node.right_node.pos_start, node.right_node.pos_end, context)
+      _, error = getattr(left, op_name)(right)
+      raise ErrorSignal(error)
+
+    if len(steps) == 1:
+      (op_name, right_code, node), = steps
+
+      def bin_op(context):
+        left = first_code(context)
+        right = right_code(context)
+        result, error = getattr(left, op_name)(right)
+        if error: fail(left, right, op_name, node, context)
+        return result
+      return bin_op
+
+    def bin_op_chain_(context):
+      left = first_code(context)
+      for op_name, right_code, node in steps:
+        right = right_code(context)
+        result, error = getattr(left, op_name)(right)
+        if error: fail(left, right, op_name, node, context)
+        left = result
+      return left
+    return bin_op_chain_
+
+  def compile_UnaryOpNode(self, node):
+    operand_code = self.compile(node.node)
+    is_minus = node.op_tok.type == TT_MINUS
+    is_not = node.op_tok.matches(TT_KEYWORD, 'CAP')
+    operand_node = node.node
+
+    def operate(number):
+      error = None
+
+      if is_minus:
+        number, error = number.multed_by(Number.minus_one)
+      elif is_not:
+        number, error = number.notted()
+
+      return number, error
+
+    def unary_op(context):
+      operand = operand_code(context)
+      number, error = operate(operand)
+      if error:
+        operand = operand.located(operand_node.pos_start, operand_node.pos_end, context)
+        _, error = operate(operand)
+        raise ErrorSignal(error)
+      return number
+    return unary_op
+
+  def compile_IfNode(self, node):
+    cases = [
+      (self.compile(condition), self.compile(expr), should_return_null)
+      for condition, expr, should_return_null in node.cases
+    ]
+    else_case = None
+    if node.else_case:
+      expr, should_return_null = node.else_case
+      else_case = (self.compile(expr), should_return_null)
+
+    def if_(context):
+      for condition_code, expr_code, should_return_null in cases:
+        if condition_code(context).is_true():
+          expr_value = expr_code(context)
+          return Number.null if should_return_null else expr_value
+
+      if else_case:
+        expr_code, should_return_null = else_case
+        expr_value = expr_code(context)
+        return Number.null if should_return_null else expr_value
+
+      return Number.null
+    return if_
+
+  def compile_ForNode(self, node):
+    start_code = self.compile(node.start_value_node)
+    end_code = self.compile(node.end_value_node)
+    step_code = self.compile(node.step_value_node) if node.step_value_node else None
+
+    def values(context):
+      start = start_code(context).value
+      end = end_code(context).value
+      step = step_code(context).value if step_code else 1
+      return map(Number.of, count_loop(start, end, step))
+    return self.compile_loop(node, values)
+
+  def compile_ForEachNode(self, node):
+    iterable_code = self.compile(node.iterable_node)
+    iterable_node = node.iterable_node
+
+    def values(context):
+      iterable = iterable_code(context)
+      iterator, error = iterable.iterated()
+      if error:
+        iterable = iterable.located(iterable_node.pos_start, iterable_node.pos_end, context)
+        _, error = iterable.iterated()
+        raise ErrorSignal(error)
+      return iterator
+    return self.compile_loop(node, values)
+
+  # Binds the loop variable of a FOR or for-each node to each value that
+  # values_code produces and runs the body
+  def compile_loop(self, node, values_code):
+    var_name = node.var_name_tok.value
+    index = self.scope.slot(var_name) if self.scope else None
+    body_code = self.compile(node.body_node)
+    should_return_null = node.should_return_null
+    pos_start, pos_end = node.pos_start, node.pos_end
+
+    def loop(context):
+      elements = []
+
+      values = values_code(context)
+      symbol_table = context.symbol_table
+      slots = symbol_table.slots if index is not None else None
+      meter = run_state.meter
+
+      for value in values:
+        if meter is not None:
+          error = meter.step(pos_start, pos_end, context)
+          if error: raise ErrorSignal(error)
+
+        if slots is None:
+          symbol_table.set(var_name, value)
+        else:
+          slots[index] = value
+
+        try:
+          value = body_code(context)
+        except ContinueSignal:
+          continue
+        except BreakSignal:
+          break
+
+        if not should_return_null:
+          elements.append(value)
+
+      return (
+        Number.null if should_return_null else
+        List(elements)
+      )
+
+    # A body that can't BREAK or CONTINUE runs straight into the local slot
+    def counted_loop(context):
+      values = values_code(context)
+      slots = context.symbol_table.slots
+      meter = run_state.meter
+
+      for value in values:
+        if meter is not None:
+          error = meter.step(pos_start, pos_end, context)
+          if error: raise ErrorSignal(error)
+
+        slots[index] = value
+        body_code(context)
+
+      return Number.null
+
+    if index is not None and should_return_null and not may_exit_loop(node.body_node):
+      return counted_loop
+    return loop
+
+  def compile_WhileNode(self, node):
+    condition_code = self.compile(node.condition_node)
+    body_code = self.compile(node.body_node)
+    should_return_null = node.should_return_null
+    pos_start, pos_end = node.pos_start, node.pos_end
+
+    def while_(context):
+      elements = []
+      meter = run_state.meter
+
+      while True:
+        if meter is not None:
+          error = meter.step(pos_start, pos_end, context)
+          if error: raise ErrorSignal(error)
+
+        if not condition_code(context).is_true():
+          break
+
+        try:
+          value = body_code(context)
+        except ContinueSignal:
+          continue
+        except BreakSignal:
+          break
+
+        if not should_return_null:
+          elements.append(value)
+
+      return (
+        Number.null if should_return_null else
+        List(elements)
+      )
+    return while_
+
+  def compile_FuncDefNode(self, node):
+    func_name = node.var_name_tok.value if node.var_name_tok else None
+    index = self.scope.slot(func_name) if self.scope and func_name else None
+    body_node = node.body_node
+    scope = Resolver().resolve(node)
+    body_code = Compiler(scope).compile_body(body_node)
+    arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+    should_auto_return = node.should_auto_return
+
+    def func_def(context):
+      func_value = Function(
+        func_name, body_node, arg_names, should_auto_return, body_code, scope
+      )
+
+      if index is not None:
+        context.symbol_table.slots[index] = func_value
+      elif func_name:
+        context.symbol_table.set(func_name, func_value)
+
+      return func_value
+    return func_def
+
+  def compile_CallNode(self, node):
+    callee_code = self.compile(node.node_to_call)
+    arg_codes = [self.compile(arg_node) for arg_node in node.arg_nodes]
+    pos_start, pos_end = node.pos_start, node.pos_end
+
+    def call(context):
+      value_to_call = callee_code(context)
+      args = []
+      for arg_code in arg_codes:
+        args.append(arg_code(context))
+
+      res = value_to_call.execute(args, context, pos_start, pos_end)
+      if res.error: raise ErrorSignal(res.error)
+
+      # Break and continue can escape a function into the caller's loop
+      if res.loop_should_break: raise BreakSignal()
+      if res.loop_should_continue: raise ContinueSignal()
+
+      return res.value
+    return call
+
+  def compile_ReturnNode(self, node):
+    value_code = self.compile(node.node_to_return) if node.node_to_return else None
+
+    def return_(context):
+      raise ReturnSignal(value_code(context) if value_code else Number.null)
+    return return_
+
+  def compile_ContinueNode(self, node):
+    def continue_(context):
+      raise ContinueSignal()
+    return continue_
+
+  def compile_BreakNode(self, node):
+    def break_(context):
+      raise BreakSignal()
+    return break_
+
+#######################################
+# OPTIMIZER
+#######################################
+
+MAX_FOLDED_STRING_LENGTH = 4096
+
+# Rewrites the AST before it runs: operations on literals are computed once,
+# IF cases with a literal condition are decided, and statements following a
+# RETURN, CONTINUE or BREAK are dropped. An operation that fails is left as
+# it is, so its error is still reported at the same position when it runs.
+# The input tree is never changed, since the program cache shares it between
+# runs: a node whose children change is replaced by a copy.
+class Optimizer:
+  def optimize(self, node):
+    method_name = f'optimize_{type(node).__name__}'
+    method = getattr(self, method_name, self.no_optimize_method)
+    return method(node)
+
+  def no_optimize_method(self, node):
+    raise Exception(f'No optimize_{type(node).__name__} method defined')
+
+  def replace(self, original, **fields):
+    if all(getattr(original, name) is value for name, value in fields.items()):
+      return original
+
+    new_node = object.__new__(type(original))
+    for name in type(original).__slots__:
+      setattr(new_node, name, fields[name] if name in fields else getattr(original, name))
+    return new_node
+
+  def unchanged(self, new_nodes, old_nodes):
+    return len(new_nodes) == len(old_nodes) and all(new is old for new, old in zip(new_nodes, old_nodes))
+
+  def is_constant(self, node):
+    return isinstance(node, (NumberNode, StringNode))
+
+  def constant(self, value, pos_start, pos_end):
+    if isinstance(value, Number):
+      type_ = TT_INT if isinstance(value.value, int) else TT_FLOAT
+      return NumberNode(Token(type_, value.value, pos_start, pos_end))
+    if isinstance(value, String) and len(value.value) <= MAX_FOLDED_STRING_LENGTH:
+      return StringNode(Token(TT_STRING, value.value, pos_start, pos_end))
+    return None
+
+  # A repeated string is only built when the result is small enough to fold
+  def is_foldable(self, op_tok, left, right):
+    if op_tok.type == TT_POW: return False
+    if op_tok.type == TT_MUL and isinstance(left, String):
+      count = right.value if isinstance(right, Number) else None
+      return type(count) is int and len(left.value) * count <= MAX_FOLDED_STRING_LENGTH
+    return True
+
+  ###################################
+
+  def optimize_NumberNode(self, node): return node
+  def optimize_StringNode(self, node): return node
+  def optimize_VarAccessNode(self, node): return node
+  def optimize_ContinueNode(self, node): return node
+  def optimize_BreakNode(self, node): return node
+
+  def optimize_ListNode(self, node):
+    element_nodes = []
+    for element_node in node.element_nodes:
+      element_node = self.optimize(element_node)
+      element_nodes.append(element_node)
+      if isinstance(element_node, (ReturnNode, ContinueNode, BreakNode)): break
+
+    if self.unchanged(element_nodes, node.element_nodes): return node
+    return self.replace(node, element_nodes=element_nodes)
+
+  def optimize_VarAssignNode(self, node):
+    return self.replace(node, value_node=self.optimize(node.value_node))
+
+  def optimize_BinOpNode(self, node):
+    first_node, chain = bin_op_chain(node)
+    left_node = self.optimize(first_node)
+
+    for node in chain:
+      node = self.replace(node, left_node=left_node, right_node=self.optimize(node.right_node))
+      left_node = self.fold_bin_op(node)
+
+    return left_node
+
+  # Powers are never folded: a huge one could hang the parse of a program
+  # that would never have evaluated it
+  def fold_bin_op(self, node):
+    op_tok = node.op_tok
+
+    if not self.is_constant(node.left_node) or not self.is_constant(node.right_node): return node
+    if not self.is_foldable(op_tok, node.left_node.value, node.right_node.value): return node
+
+    op_name = BINARY_OPS[op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type]
+    result, error = getattr(node.left_node.value, op_name)(node.right_node.value)
+    if error: return node
+    return self.constant(result, node.pos_start, node.pos_end) or node
+
+  def optimize_UnaryOpNode(self, node):
+    node = self.replace(node, node=self.optimize(node.node))
+    if not isinstance(node.node, NumberNode): return node
+
+    result, error = Interpreter().operate_unary(node.op_tok, node.node.value)
+    if error: return node
+    return self.constant(result, node.pos_start, node.pos_end) or node
+
+  def optimize_IfNode(self, node):
+    cases = []
+    else_case = node.else_case
+
+    for condition, expr, should_return_null in node.cases:
+      condition = self.optimize(condition)
+      if not self.is_constant(condition):
+        cases.append((condition, self.optimize(expr), should_return_null))
+      elif condition.value.is_true():
+        else_case = (expr, should_return_null)
+        break
+
+    if else_case:
+      expr, should_return_null = else_case
+      else_case = (self.optimize(expr), should_return_null)
+
+      if not cases and not should_return_null:
+        return else_case[0]
+
+    return self.replace(node, cases=cases, else_case=else_case)
+
+  def optimize_ForNode(self, node):
+    return self.replace(
+      node,
+      start_value_node=self.optimize(node.start_value_node),
+      end_value_node=self.optimize(node.end_value_node),
+      step_value_node=self.optimize(node.step_value_node) if node.step_value_node else None,
+      body_node=self.optimize(node.body_node)
+    )
+
+  def optimize_ForEachNode(self, node):
+    return self.replace(
+      node,
+      iterable_node=self.optimize(node.iterable_node),
+      body_node=self.optimize(node.body_node)
+    )
+
+  def optimize_WhileNode(self, node):
+    return self.replace(
+      node,
+      condition_node=self.optimize(node.condition_node),
+      body_node=self.optimize(node.body_node)
+    )
+
+  def optimize_FuncDefNode(self, node):
+    return self.replace(node, body_node=self.optimize(node.body_node))
+
+  def optimize_CallNode(self, node):
+    arg_nodes = [self.optimize(arg_node) for arg_node in node.arg_nodes]
+    if self.unchanged(arg_nodes, node.arg_nodes):
+      arg_nodes = node.arg_nodes
+    return self.replace(node, node_to_call=self.optimize(node.node_to_call), arg_nodes=arg_nodes)
+
+  def optimize_ReturnNode(self, node):
+    if not node.node_to_return: return node
+    return self.replace(node, node_to_return=self.optimize(node.node_to_return))
+
+#######################################
+# BYTECODE
+#######################################
+
+OP_LOAD_CONST       = 0
+OP_LOAD_NAME        = 1
+OP_STORE_NAME       = 2
+OP_POP              = 3
+OP_BUILD_LIST       = 4
+OP_BINARY_OP        = 5
+OP_UNARY_MINUS      = 6
+OP_UNARY_NOT        = 7
+OP_JUMP             = 8
+OP_POP_JUMP_IF_FALSE = 9
+OP_SETUP_LOOP       = 10
+OP_POP_BLOCK        = 11
+OP_BREAK            = 12
+OP_CONTINUE         = 13
+OP_FOR_SETUP        = 14
+OP_FOR_ITER         = 15
+OP_LIST_NEW         = 16
+OP_LIST_APPEND      = 17
+OP_LOAD_LIST        = 18
+OP_MAKE_FUNCTION    = 19
+OP_CALL             = 20
+OP_RETURN           = 21
+OP_RETURN_END       = 22
+OP_LOAD_FAST        = 23
+OP_STORE_FAST       = 24
+OP_LOAD_FREE        = 25
+OP_LOOP             = 26
+OP_GET_ITER         = 27
+
+# A flat instruction array of (opcode, operand) pairs plus the number of
+# hidden local slots the VM reserves for loop counters and accumulators.
+class Code:
+  def __init__(self, name):
+    self.name = name
+    self.ops = []
+    self.num_locals = 0
+
+  def emit(self, op, arg=None):
+    self.ops.append(op)
+    self.ops.append(arg)
+    return len(self.ops) - 2
+
+  def patch(self, index, arg):
+    self.ops[index + 1] = arg
+
+  def here(self):
+    return len(self.ops)
+
+  def new_locals(self, count):
+    slot = self.num_locals
+    self.num_locals += count
+    return slot
+
+  def __call__(self, context):
+    return VM().run(self, context)
+
+  def __repr__(self):
+    return f'<code {self.name}>'
+
+# Like the Compiler, scope is a function's Scope or the GlobalTable that
+# top-level code will run in.
+class BytecodeCompiler:
+  def __init__(self, scope=None):
+    self.scope = scope
+
+  def compile(self, node, name='<program>'):
+    self.code = Code(name)
+    self.lower(node)
+    self.code.emit(OP_RETURN_END)
+    return self.code
+
+  def lower(self, node):
+    method_name = f'lower_{type(node).__name__}'
+    method = getattr(self, method_name, self.no_lower_method)
+    method(node)
+
+  def no_lower_method(self, node):
+    raise Exception(f'No lower_{type(node).__name__} method defined')
+
+  ###################################
+
+  def lower_NumberNode(self, node):
+    self.code.emit(OP_LOAD_CONST, node.value)
+
+  def lower_StringNode(self, node):
+    self.code.emit(OP_LOAD_CONST, node.value)
+
+  def lower_ListNode(self, node):
+    for element_node in node.element_nodes:
+      self.lower(element_node)
+    self.code.emit(OP_BUILD_LIST, len(node.element_nodes))
+
+  def lower_VarAccessNode(self, node):
+    var_name = node.var_name_tok.value
+    index = self.slot(var_name)
+
+    if not self.scope:
+      self.code.emit(OP_LOAD_NAME, (var_name, node.pos_start, node.pos_end))
+    elif index is not None:
+      self.code.emit(OP_LOAD_FAST, (index, var_name, node.pos_start, node.pos_end))
+    else:
+      self.code.emit(OP_LOAD_FREE, (var_name, node.pos_start, node.pos_end))
+
+  def lower_VarAssignNode(self, node):
+    self.lower(node.value_node)
+    self.store(node.var_name_tok.value)
+
+  def slot(self, var_name):
+    return self.scope.slot(var_name) if self.scope else None
+
+  def store(self, var_name):
+    index = self.slot(var_name)
+    if index is None:
+      self.code.emit(OP_STORE_NAME, var_name)
+    else:
+      self.code.emit(OP_STORE_FAST, index)
+
+  def lower_BinOpNode(self, node):
+    first_node, chain = bin_op_chain(node)
+    self.lower(first_node)
+
+    for node in chain:
+      op_tok = node.op_tok
+      op_name = BINARY_OPS[op_tok.value if op_tok.type == TT_KEYWORD else op_tok.type]
+      self.lower(node.right_node)
+      self.code.emit(OP_BINARY_OP, (op_name, node.left_node, node.right_node))
+
+  def lower_UnaryOpNode(self, node):
+    self.lower(node.node)
+    if node.op_tok.type == TT_MINUS:
+      self.code.emit(OP_UNARY_MINUS, node.node)
+    elif node.op_tok.matches(TT_KEYWORD, 'CAP'):
+      self.code.emit(OP_UNARY_NOT, node.node)
+
+  def lower_IfNode(self, node):
+    code = self.code
+    end_jumps = []
+
+    for condition, expr, should_return_null in node.cases:
+      self.lower(condition)
+      next_jump = code.emit(OP_POP_JUMP_IF_FALSE)
+      self.lower_branch(expr, should_return_null)
+      end_jumps.append(code.emit(OP_JUMP))
+      code.patch(next_jump, code.here())
+
+    if node.else_case:
+      expr, should_return_null = node.else_case
+      self.lower_branch(expr, should_return_null)
+    else:
+      code.emit(OP_LOAD_CONST, Number.null)
+
+    for end_jump in end_jumps:
+      code.patch(end_jump, code.here())
+
+  def lower_branch(self, expr, should_return_null):
+    self.lower(expr)
+    if should_return_null:
+      self.code.emit(OP_POP)
+      self.code.emit(OP_LOAD_CONST, Number.null)
+
+  def lower_ForNode(self, node):
+    code = self.code
+    self.lower(node.start_value_node)
+    self.lower(node.end_value_node)
+    if node.step_value_node:
+      self.lower(node.step_value_node)
+    else:
+      code.emit(OP_LOAD_CONST, Number.true)
+
+    # Slots hold the iterator of the loop's values, followed by the element list
+    slot = code.new_locals(2)
+    code.emit(OP_FOR_SETUP, slot)
+    self.lower_loop(node, slot)
+
+  def lower_ForEachNode(self, node):
+    code = self.code
+    self.lower(node.iterable_node)
+
+    slot = code.new_locals(2)
+    code.emit(OP_GET_ITER, (slot, node.iterable_node))
+    self.lower_loop(node, slot)
+
+  def lower_loop(self, node, slot):
+    code = self.code
+    if not node.should_return_null:
+      code.emit(OP_LIST_NEW, slot + 1)
+
+    setup = code.emit(OP_SETUP_LOOP)
+    loop_start = code.here()
+    loop_iter = code.emit(OP_FOR_ITER)
+    self.lower_loop_body(node, slot + 1)
+    loop_end = code.emit(OP_LOOP, (loop_start, node.pos_start, node.pos_end))
+
+    var_name = node.var_name_tok.value
+    code.patch(loop_iter, (slot, self.slot(var_name), var_name, code.here()))
+    self.lower_loop_exit(node, setup, loop_end, slot + 1)
+
+  def lower_WhileNode(self, node):
+    code = self.code
+    slot = code.new_locals(1)
+    if not node.should_return_null:
+      code.emit(OP_LIST_NEW, slot)
+
+    setup = code.emit(OP_SETUP_LOOP)
+    loop_start = code.here()
+    self.lower(node.condition_node)
+    exit_jump = code.emit(OP_POP_JUMP_IF_FALSE)
+    self.lower_loop_body(node, slot)
+    loop_end = code.emit(OP_LOOP, (loop_start, node.pos_start, node.pos_end))
+
+    code.patch(exit_jump, code.here())
+    self.lower_loop_exit(node, setup, loop_end, slot)
+
+  def lower_loop_body(self, node, elements_slot):
+    self.lower(node.body_node)
+    if node.should_return_null:
+      self.code.emit(OP_POP)
+    else:
+      self.code.emit(OP_LIST_APPEND, elements_slot)
+
+  # CONTINUE jumps to the loop's OP_LOOP, so it is charged a step as well
+  def lower_loop_exit(self, node, setup, loop_end, elements_slot):
+    code = self.code
+    code.emit(OP_POP_BLOCK)
+    code.patch(setup, (code.here(), loop_end))
+
+    if node.should_return_null:
+      code.emit(OP_LOAD_CONST, Number.null)
+    else:
+      code.emit(OP_LOAD_LIST, elements_slot)
+
+  def lower_FuncDefNode(self, node):
+    func_name = node.var_name_tok.value if node.var_name_tok else None
+    scope = Resolver().resolve(node)
+    body_code = BytecodeCompiler(scope).compile(node.body_node, func_name or '<anonymous>')
+    arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+
+    self.code.emit(OP_MAKE_FUNCTION, (
+      func_name, node.body_node, body_code, scope, arg_names,
+      node.should_auto_return
+    ))
+    if func_name:
+      self.store(func_name)
+
+  def lower_CallNode(self, node):
+    self.lower(node.node_to_call)
+    for arg_node in node.arg_nodes:
+      self.lower(arg_node)
+    self.code.emit(OP_CALL, (len(node.arg_nodes), node.pos_start, node.pos_end))
+
+  def lower_ReturnNode(self, node):
+    if node.node_to_return:
+      self.lower(node.node_to_return)
+    else:
+      self.code.emit(OP_LOAD_CONST, Number.null)
+    self.code.emit(OP_RETURN)
+
+  def lower_ContinueNode(self, node):
+    self.code.emit(OP_CONTINUE)
+
+  def lower_BreakNode(self, node):
+    self.code.emit(OP_BREAK)
+
+#######################################
+# VIRTUAL MACHINE
+#######################################
+
+class VM:
+  def run(self, code, context):
+    ops = code.ops
+    slots = [None] * code.num_locals
+    table = context.symbol_table
+    meter = run_state.meter
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    blocks = []
+    pc = 0
+
+    while True:
+      op = ops[pc]
+      arg = ops[pc + 1]
+      pc += 2
+
+      if op == OP_LOAD_FAST:
+        index, var_name, pos_start, pos_end = arg
+        value = table.slots[index]
+
+        # A local that has not been assigned yet still falls back to the caller,
+        # and an empty global slot to the builtins
+        if value is None:
+          value = table.parent.get(var_name)
+          if not value:
+            return RTResult().failure(RTError(
+              pos_start, pos_end,
+              f"'{var_name}' is not defined",
+              context
+            ))
+
+        push(value)
+
+      elif op == OP_STORE_FAST:
+        table.slots[arg] = stack[-1]
+
+      elif op == OP_LOAD_FREE:
+        var_name, pos_start, pos_end = arg
+        globals_ = table.globals
+        if globals_ is None or var_name in globals_.bound_names:
+          value = table.get(var_name)
+        else:
+          value = globals_.get(var_name)
+
+        if not value:
+          return RTResult().failure(RTError(
+            pos_start, pos_end,
+            f"'{var_name}' is not defined",
+            context
+          ))
+
+        push(value)
+
+      elif op == OP_LOAD_NAME:
+        var_name, pos_start, pos_end = arg
+        value = table.get(var_name)
+
+        if not value:
+          return RTResult().failure(RTError(
+            pos_start, pos_end,
+            f"'{var_name}' is not defined",
+            context
+          ))
+
+        push(value)
+
+      elif op == OP_LOAD_CONST:
+        push(arg)
+
+      elif op == OP_BINARY_OP:
+        op_name, left_node, right_node = arg
+        right = pop()
+        left = pop()
+        result, error = getattr(left, op_name)(right)
+        if error:
+          left = left.located(left_node.pos_start, left_node.pos_end, context)
+          right = right.located(right_node.pos_start, right_node.pos_end, context)
+          _, error = getattr(left, op_name)(right)
+          return RTResult().failure(error)
+        push(result)
+
+      elif op == OP_STORE_NAME:
+        table.set(arg, stack[-1])
+
+      elif op == OP_POP:
+        pop()
+
+      elif op == OP_FOR_ITER:
+        slot, index, var_name, exit_target = arg
+        value = next(slots[slot], None)
+
+        if value is None:
+          pc = exit_target
+        elif index is None:
+          table.set(var_name, value)
+        else:
+          table.slots[index] = value
+
+      elif op == OP_JUMP:
+        pc = arg
+
+      elif op == OP_LOOP:
+        pc, pos_start, pos_end = arg
+        if meter is not None:
+          error = meter.step(pos_start, pos_end, context)
+          if error: return RTResult().failure(error)
+
+      elif op == OP_POP_JUMP_IF_FALSE:
+        if not pop().is_true():
+          pc = arg
+
+      elif op == OP_LIST_APPEND:
+        slots[arg].append(pop())
+
+      elif op == OP_CALL:
+        arg_count, pos_start, pos_end = arg
+        if arg_count:
+          args = stack[-arg_count:]
+          del stack[-arg_count:]
+        else:
+          args = []
+        value_to_call = pop()
+
+        res = value_to_call.execute(args, context, pos_start, pos_end)
+        if res.error: return res
+
+        # Break and continue can escape a function into the caller's loop
+        if res.loop_should_break:
+          op = OP_BREAK
+        elif res.loop_should_continue:
+          op = OP_CONTINUE
+        else:
+          push(res.value)
+
+        if op == OP_BREAK:
+          if not blocks: return RTResult().success_break()
+          height, break_target, _ = blocks.pop()
+          del stack[height:]
+          pc = break_target
+        elif op == OP_CONTINUE:
+          if not blocks: return RTResult().success_continue()
+          height, _, continue_target = blocks[-1]
+          del stack[height:]
+          pc = continue_target
+
+      elif op == OP_BUILD_LIST:
+        if arg:
+          elements = stack[-arg:]
+          del stack[-arg:]
+        else:
+          elements = []
+        push(List(elements))
+
+      elif op == OP_UNARY_MINUS:
+        operand = pop()
+        number, error = operand.multed_by(Number.minus_one)
+        if error:
+          operand = operand.located(arg.pos_start, arg.pos_end, context)
+          _, error = operand.multed_by(Number.minus_one)
+          return RTResult().failure(error)
+        push(number)
+
+      elif op == OP_UNARY_NOT:
+        operand = pop()
+        number, error = operand.notted()
+        if error:
+          operand = operand.located(arg.pos_start, arg.pos_end, context)
+          _, error = operand.notted()
+          return RTResult().failure(error)
+        push(number)
+
+      elif op == OP_SETUP_LOOP:
+        break_target, continue_target = arg
+        blocks.append((len(stack), break_target, continue_target))
+
+      elif op == OP_POP_BLOCK:
+        blocks.pop()
+
+      elif op == OP_BREAK:
+        if not blocks: return RTResult().success_break()
+        height, break_target, _ = blocks.pop()
+        del stack[height:]
+        pc = break_target
+
+      elif op == OP_CONTINUE:
+        if not blocks: return RTResult().success_continue()
+        height, _, continue_target = blocks[-1]
+        del stack[height:]
+        pc = continue_target
+
+      elif op == OP_FOR_SETUP:
+        step = pop()
+        end = pop()
+        start = pop()
+        slots[arg] = map(Number.of, count_loop(start.value, end.value, step.value))
+
+      elif op == OP_GET_ITER:
+        slot, iterable_node = arg
+        iterable = pop()
+        iterator, error = iterable.iterated()
+        if error:
+          iterable = iterable.located(iterable_node.pos_start, iterable_node.pos_end, context)
+          _, error = iterable.iterated()
+          return RTResult().failure(error)
+        slots[slot] = iterator
+
+      elif op == OP_LIST_NEW:
+        slots[arg] = []
+
+      elif op == OP_LOAD_LIST:
+        push(List(slots[arg]))
+
+      elif op == OP_MAKE_FUNCTION:
+        func_name, body_node, body_code, scope, arg_names, should_auto_return = arg
+        push(Function(
+          func_name, body_node, arg_names, should_auto_return, body_code, scope
+        ))
+
+      elif op == OP_RETURN:
+        return RTResult().success_return(pop())
+
+      elif op == OP_RETURN_END:
+        return RTResult().success(pop())
+
+      else:
+        raise Exception(f'Unknown opcode {op}')
+
 #######################################
 # RUN
 #######################################
 
-global_symbol_table = SymbolTable()
-global_symbol_table.set("NULL", Number.null)
-global_symbol_table.set("FALSE", Number.false)
-global_symbol_table.set("TRUE", Number.true)
-global_symbol_table.set("MATH_PI", Number.math_PI)
-global_symbol_table.set("TYPESHI", BuiltInFunction.print)
-global_symbol_table.set("TYPESHI_RET", BuiltInFunction.print_ret)
-global_symbol_table.set("INPUT", BuiltInFunction.input)
-global_symbol_table.set("INPUT_INT", BuiltInFunction.input_int)
-global_symbol_table.set("CLEAR", BuiltInFunction.clear)
-global_symbol_table.set("CLS", BuiltInFunction.clear)
-global_symbol_table.set("IS_NUM", BuiltInFunction.is_number)
-global_symbol_table.set("IS_STR", BuiltInFunction.is_string)
-global_symbol_table.set("IS_LIST", BuiltInFunction.is_list)
-global_symbol_table.set("IS_FUN", BuiltInFunction.is_function)
-global_symbol_table.set("APPEND", BuiltInFunction.append)
-global_symbol_table.set("POP", BuiltInFunction.pop)
-global_symbol_table.set("EXTEND", BuiltInFunction.extend)
-global_symbol_table.set("LEN", BuiltInFunction.len)
-global_symbol_table.set("RUN", BuiltInFunction.run)
-global_symbol_table.set("INT", BuiltInFunction.int)
-
-def run(fn, text, parent_context=None): # New optional argument
-    lexer = Lexer(fn, text)
+builtin_symbol_table = BuiltinSymbolTable()
+builtin_symbol_table.set("NULL", Number.null)
+builtin_symbol_table.set("FALSE", Number.false)
+builtin_symbol_table.set("TRUE", Number.true)
+builtin_symbol_table.set("MATH_PI", Number.math_PI)
+builtin_symbol_table.set("TYPESHI", BuiltInFunction.print)
+builtin_symbol_table.set("TYPESHI_RET", BuiltInFunction.print_ret)
+builtin_symbol_table.set("INPUT", BuiltInFunction.input)
+builtin_symbol_table.set("INPUT_INT", BuiltInFunction.input_int)
+builtin_symbol_table.set("CLEAR", BuiltInFunction.clear)
+builtin_symbol_table.set("CLS", BuiltInFunction.clear)
+builtin_symbol_table.set("IS_NUM", BuiltInFunction.is_number)
+builtin_symbol_table.set("IS_STR", BuiltInFunction.is_string)
+builtin_symbol_table.set("IS_LIST", BuiltInFunction.is_list)
+builtin_symbol_table.set("IS_FUN", BuiltInFunction.is_function)
+builtin_symbol_table.set("APPEND", BuiltInFunction.append)
+builtin_symbol_table.set("POP", BuiltInFunction.pop)
+builtin_symbol_table.set("EXTEND", BuiltInFunction.extend)
+builtin_symbol_table.set("LEN", BuiltInFunction.len)
+builtin_symbol_table.set("RUN", BuiltInFunction.run)
+builtin_symbol_table.set("INT", BuiltInFunction.int)
+builtin_symbol_table.set("VECTOR", BuiltInFunction.vector)
+builtin_symbol_table.set("TO_LIST", BuiltInFunction.to_list)
+builtin_symbol_table.set("SUM", BuiltInFunction.sum)
+builtin_symbol_table.set("MAP_ADD", BuiltInFunction.map_add)
+builtin_symbol_table.set("DOT", BuiltInFunction.dot)
+builtin_symbol_table.set("RANGE", BuiltInFunction.range)
+builtin_symbol_table.set("SORT", BuiltInFunction.sort)
+builtin_symbol_table.freeze()
+
+# A fresh global scope for one run. The builtins are not copied into it, so
+# an isolated run costs no more to set up than a shared one.
+def new_global_scope():
+    return GlobalTable(builtin_symbol_table)
+
+# The scope used by runs that don't bring their own context, like the shell
+global_symbol_table = new_global_scope()
+
+def parse(fn, text):
+    lexer_mode = os.environ.get('ZINGO_LEXER', 'regex')
+
+    if lexer_mode == 'regex':
+        lexer = RegexLexer(fn, text)
+    elif lexer_mode == 'char':
+        lexer = Lexer(fn, text)
+    else:
+        raise Exception(f"Unknown lexer '{lexer_mode}'")
+
     tokens, error = lexer.make_tokens()
     if error:
         return None, error
 
+    # Nesting that is too deep for Python's stack is a syntax error too
     parser = Parser(tokens)
-    ast = parser.parse()
+    try:
+        ast = parser.parse()
+    except RecursionError:
+        return None, InvalidSyntaxError(
+            tokens[0].pos_start, tokens[-1].pos_end,
+            'Expression is nested too deeply'
+        )
     if ast.error:
         return None, ast.error
 
-    interpreter = Interpreter()
+    return ast.node, None
+
+# engine selects how the parsed program is executed, falling back to the
+# ZINGO_ENGINE environment variable:
+#   'compiler'    - compile the AST to closures first (default)
+#   'vm'          - lower the AST to bytecode and run it on the VM
+#   'interpreter' - walk the AST with the reference Interpreter
+# budget optionally limits the steps, time and memory the run may use.
+def run_program(node, parent_context=None, engine=None, optimize=None, budget=None):
+    if optimize is None:
+        optimize = os.environ.get('ZINGO_OPTIMIZE', '0') == '1'
 
     # Use parent_context if provided (for bridge_test), otherwise create a new one
     if parent_context:
@@ -2229,7 +4482,37 @@ def run(fn, text, parent_context=None): # New optional argument
         context = Context('<program>')
         context.symbol_table = global_symbol_table
 
-    result = interpreter.visit(ast.node, context)
+    engine = engine or os.environ.get('ZINGO_ENGINE', 'compiler')
+
+    # Top-level code addresses globals by slot when it runs on a GlobalTable
+    table = context.symbol_table
+    global_scope = table if isinstance(table, GlobalTable) else None
+
+    if engine == 'interpreter':
+        execute = lambda node: Interpreter().visit(node, context)
+    elif engine == 'compiler':
+        execute = lambda node: Compiler(global_scope).compile_body(node)(context)
+    elif engine == 'vm':
+        execute = lambda node: VM().run(BytecodeCompiler(global_scope).compile(node), context)
+    else:
+        raise Exception(f"Unknown engine '{engine}'")
+
+    # Nesting or recursion deeper than Python's stack allows ends the run
+    # with an error instead of escaping to the caller
+    previous_settings = run_state.engine, run_state.optimize
+    run_state.engine, run_state.optimize = engine, optimize
+    previous_meter = start_budget(budget)
+    try:
+        result = execute(Optimizer().optimize(node) if optimize else node)
+    except RecursionError:
+        result = RTResult().failure(RTError(
+            node.pos_start, node.pos_end,
+            'Maximum recursion depth exceeded',
+            context
+        ))
+    finally:
+        run_state.meter = previous_meter
+        run_state.engine, run_state.optimize = previous_settings
 
     # Use the robust return logic (as previously recommended)
     if result.func_return_value is not None:
@@ -2237,4 +4520,279 @@ def run(fn, text, parent_context=None): # New optional argument
     else:
         value = result.value
 
-    return value, result.error
\ No newline at end of file
+    return value, result.error
+
+def run(fn, text, parent_context=None, engine=None, optimize=None, budget=None): # New optional argument
+    key = (fn, hashlib.blake2b(text.encode(), digest_size=16).digest())
+    node = program_cache.get(key)
+
+    if node is None:
+        node, error = parse(fn, text)
+        if error:
+            return None, error
+        program_cache.put(key, node, len(text))
+
+    return run_program(node, parent_context, engine, optimize, budget)
+
+# Runs a script from disk, reusing its cached AST when it is still fresh.
+# fn is the name shown in errors and defaults to the path.
+def run_file(path, parent_context=None, engine=None, optimize=None, fn=None, budget=None):
+    node, error = load_program(path, fn)
+    if error:
+        return None, error
+
+    return run_program(node, parent_context, engine, optimize, budget)
+
+#######################################
+# PROGRAM CACHE
+#######################################
+
+# Parsed programs are pickled much like .pyc files, but into a cache
+# directory of the current user: $ZINGO_CACHE_DIR, else $XDG_CACHE_HOME/zingo,
+# else ~/.cache/zingo. Unpickling can run arbitrary code, so entries are never
+# read from next to a script, where whoever ships the script could plant one,
+# nor from a cache directory that someone else owns or can write to. An entry
+# is trusted while the script's mtime and size are unchanged; otherwise the
+# source is re-read and its hash decides whether the entry can still be used.
+# Set ZINGO_CACHE=0 to bypass the cache.
+CACHE_MAGIC = 'zingo-ast-3'
+
+def cache_dir():
+    directory = os.environ.get('ZINGO_CACHE_DIR')
+    if not directory:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        directory = os.path.join(base, 'zingo')
+    return directory
+
+def cache_path(path):
+    path = os.path.abspath(path)
+    key = hashlib.sha256(f'{CACHE_MAGIC}:{path}'.encode()).hexdigest()[:32]
+    return os.path.join(cache_dir(), f'{os.path.basename(path)}-{key}.zc')
+
+def is_private_dir(directory):
+    try:
+        info = os.stat(directory)
+    except OSError:
+        return False
+
+    # Windows has no owner ids, and its per-user profile is private already
+    if not hasattr(os, 'getuid'):
+        return True
+    return info.st_uid == os.getuid() and not info.st_mode & 0o022
+
+def read_cache_entry(path):
+    if not is_private_dir(cache_dir()):
+        return None
+
+    try:
+        with open(cache_path(path), 'rb') as f:
+            entry = pickle.load(f)
+    except Exception:
+        return None
+
+    if type(entry) is not tuple or len(entry) != 6 or entry[0] != CACHE_MAGIC:
+        return None
+    return entry
+
+def write_cache_entry(path, entry):
+    target = cache_path(path)
+    temp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        os.makedirs(os.path.dirname(target), mode=0o700, exist_ok=True)
+        if not is_private_dir(os.path.dirname(target)):
+            return
+        with open(temp, 'wb') as f:
+            pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, target)
+    except (OSError, pickle.PicklingError, RecursionError):
+        # The cache is only an accelerator, a script that can't be cached
+        # still runs
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+# Returns (node, error) like parse, and raises OSError when the script can't
+# be read.
+def load_program(path, fn=None):
+    fn = fn or path
+
+    if os.environ.get('ZINGO_CACHE', '1') == '0':
+        with open(path, 'r') as f:
+            return parse(fn, f.read())
+
+    stat = os.stat(path)
+    entry = read_cache_entry(path)
+    if entry and entry[1] == fn and entry[2] == stat.st_mtime_ns and entry[3] == stat.st_size:
+        return entry[5], None
+
+    with open(path, 'r') as f:
+        text = f.read()
+    digest = hashlib.sha256(text.encode()).hexdigest()
+
+    if entry and entry[1] == fn and entry[4] == digest:
+        node = entry[5]
+    else:
+        node, error = parse(fn, text)
+        if error:
+            return None, error
+
+    write_cache_entry(path, (CACHE_MAGIC, fn, stat.st_mtime_ns, stat.st_size, digest, node))
+    return node, None
+
+# Keeps the ASTs of recently run source strings in memory, so callers that
+# pass the same text to run() over and over only parse it once. The cache is
+# bounded both by entry count and by the total length of the cached sources.
+# A cached tree is shared by every run of its source, whatever the engine or
+# optimize flag, so it must never change once inserted: the parser is done
+# with it by then, and the optimizer and engines only build new nodes or code.
+class ProgramCache:
+  def __init__(self, max_entries=256, max_size=4 * 1024 * 1024):
+    self.max_entries = max_entries
+    self.max_size = max_size
+    self.entries = collections.OrderedDict()
+    self.size = 0
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.lock = threading.Lock()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None:
+        self.misses += 1
+        return None
+
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def put(self, key, node, size):
+    if size > self.max_size or self.max_entries <= 0:
+      return
+
+    with self.lock:
+      old = self.entries.pop(key, None)
+      if old is not None:
+        self.size -= old[1]
+
+      self.entries[key] = (node, size)
+      self.size += size
+      self.trim()
+
+  def trim(self):
+    while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_size):
+      _, (_, size) = self.entries.popitem(last=False)
+      self.size -= size
+      self.evictions += 1
+
+  def resize(self, max_entries=None, max_size=None):
+    with self.lock:
+      if max_entries is not None: self.max_entries = max_entries
+      if max_size is not None: self.max_size = max_size
+      self.trim()
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+      self.size = 0
+
+  def stats(self):
+    return {
+      'entries': len(self.entries),
+      'size': self.size,
+      'hits': self.hits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+    }
+
+program_cache = ProgramCache()
+
+#######################################
+# EXECUTOR
+#######################################
+
+class RunResult:
+  def __init__(self, fn, value, error, output):
+    self.fn = fn
+    self.value = value
+    self.error = error
+    self.output = output
+
+  def __repr__(self):
+    return f'RunResult({self.fn!r}, value={self.value!r}, error={self.error!r})'
+
+def to_value(value):
+    if isinstance(value, Value):
+        return value
+    if isinstance(value, bool):
+        return Number.of(int(value))
+    if isinstance(value, (int, float)):
+        return Number.of(value)
+    if isinstance(value, str):
+        return String(value)
+    if isinstance(value, (list, tuple)):
+        return List([to_value(element) for element in value])
+    raise TypeError(f"Can't convert {type(value).__name__} to a Zingo value")
+
+# Calls runner(context) with a context that has a global scope of its own.
+# The result only holds strings so it can be sent back from a worker process.
+def run_in_isolation(fn, runner, variables=None):
+    context = Context('<program>')
+    context.symbol_table = new_global_scope()
+    for name, value in (variables or {}).items():
+        context.symbol_table.set(name, to_value(value))
+
+    run_state.output = output = []
+    try:
+        value, error = runner(context)
+    finally:
+        run_state.output = None
+
+    return RunResult(
+        fn,
+        repr(value) if value is not None else None,
+        error.as_string() if error else None,
+        output
+    )
+
+def run_isolated(fn, text, variables=None, engine=None, optimize=None, budget=None):
+    return run_in_isolation(fn, lambda context: run(fn, text, context, engine, optimize, budget=budget), variables)
+
+def run_file_isolated(path, variables=None, engine=None, optimize=None, budget=None):
+    return run_in_isolation(path, lambda context: run_file(path, context, engine, optimize, budget=budget), variables)
+
+# Runs independent scripts on a pool of threads or processes. Threads share
+# the program cache but are limited by the GIL; processes scale CPU-bound
+# scripts across cores.
+class Executor:
+  def __init__(self, workers=None, kind='thread', engine=None, optimize=None, budget=None):
+    if kind == 'thread':
+      self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+    elif kind == 'process':
+      self.pool = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+      raise Exception(f"Unknown executor kind '{kind}'")
+
+    self.engine = engine
+    self.optimize = optimize
+    self.budget = budget
+
+  def submit(self, fn, text, variables=None):
+    return self.pool.submit(run_isolated, fn, text, variables, self.engine, self.optimize, self.budget)
+
+  # scripts holds (fn, text) or (fn, text, variables) tuples
+  def map(self, scripts):
+    futures = [self.submit(*script) for script in scripts]
+    return [future.result() for future in futures]
+
+  def shutdown(self, wait=True):
+    self.pool.shutdown(wait)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.shutdown()
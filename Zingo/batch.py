@@ -0,0 +1,99 @@
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import basic
+
+def find_scripts(directory):
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.zingo'):
+                paths.append(os.path.join(root, name))
+    return paths
+
+def load(path):
+    try:
+        node, error = basic.load_program(path)
+    except Exception as e:
+        return None, f'Failed to load script: {e}'
+    return node, error.as_string() if error else None
+
+def run_one(path, node, engine, optimize, budget):
+    start = time.perf_counter()
+    try:
+        result = basic.run_in_isolation(
+            path, lambda context: basic.run_program(node, context, engine, optimize, budget)
+        )
+        value, error, output = result.value, result.error, result.output
+    except Exception as e:
+        value, error, output = None, f'{type(e).__name__}: {e}', []
+
+    return {
+        'file': path,
+        'value': value,
+        'error': error,
+        'output': output,
+        'seconds': round(time.perf_counter() - start, 6),
+    }
+
+# Every program of a batch is parsed (or read back from the on-disk cache)
+# before the first one runs, so a worker does its loading in one go
+def run_batch(paths, engine=None, optimize=None, budget=None):
+    programs = [(path, *load(path)) for path in paths]
+    results = []
+
+    for path, node, error in programs:
+        if error:
+            results.append({
+                'file': path,
+                'value': None,
+                'error': error,
+                'output': [],
+                'seconds': 0.0,
+            })
+        else:
+            results.append(run_one(path, node, engine, optimize, budget))
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run every .zingo script under a directory on all cores and '
+                    'print one JSON result per line.'
+    )
+    parser.add_argument('directory')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--engine', choices=('compiler', 'vm', 'interpreter'))
+    parser.add_argument('--optimize', action='store_true', default=None)
+    parser.add_argument('--max-steps', type=int, help='stop a script after this many loop iterations and calls')
+    parser.add_argument('--timeout', type=float, help='stop a script after this many seconds')
+    args = parser.parse_args(argv)
+
+    budget = None
+    if args.max_steps is not None or args.timeout is not None:
+        budget = basic.Budget(max_steps=args.max_steps, max_seconds=args.timeout)
+
+    paths = find_scripts(args.directory)
+    batches = [paths[i:i + args.batch_size] for i in range(0, len(paths), args.batch_size)]
+    task = functools.partial(run_batch, engine=args.engine, optimize=args.optimize, budget=budget)
+
+    failed = 0
+    with multiprocessing.Pool(args.workers) as pool:
+        for results in pool.imap_unordered(task, batches):
+            for result in results:
+                if result['error']:
+                    failed += 1
+                print(json.dumps(result), flush=True)
+
+    print(f'{len(paths)} scripts, {failed} failed', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
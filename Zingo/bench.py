@@ -0,0 +1,148 @@
+import sys
+import time
+
+import basic
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def generate_script(blocks):
+    lines = []
+    for i in range(blocks):
+        lines.append(f'PLUH total_{i} = ({i} + 3.25 * {i % 7}) / 2 - 1')
+        lines.append(f'PLUH name_{i} = "item number {i}" + "!"')
+        lines.append(f'BOP scale_{i}(a, b) -> a * b + {i}')
+        lines.append(f'PLUH values_{i} = [total_{i}, scale_{i}(2, 3), name_{i}]')
+        lines.append(f'MEWING j = 0 TO {i % 5} THEN')
+        lines.append(f'  PLUH total_{i} = total_{i} + j')
+        lines.append('BOMBOCLATT')
+    return '\n'.join(lines) + '\n'
+
+def bench_lexer(blocks=5000):
+    text = generate_script(blocks)
+    print(f'lexer: {text.count(chr(10))} lines, {len(text)} characters')
+
+    for name, lexer_class in (('char', basic.Lexer), ('regex', basic.RegexLexer)):
+        seconds = timed(lambda: lexer_class('<bench>', text).make_tokens())
+        print(f'  {name:<8} {seconds:.3f}s')
+
+def bench_parser(sizes=(1000, 2000, 4000, 8000)):
+    print('parser: time per line should stay flat as the script grows')
+
+    for blocks in sizes:
+        text = generate_script(blocks)
+        tokens, error = basic.RegexLexer('<bench>', text).make_tokens()
+        lines = text.count('\n')
+        seconds = timed(lambda: basic.Parser(tokens).parse())
+        print(f'  {lines:>7} lines {seconds:.3f}s {seconds / lines * 1e6:.1f}us/line')
+
+EXECUTOR_SCRIPT = '''
+PLUH total = 0
+MEWING i = 0 TO 20000 THEN PLUH total = total + i * i / 3
+BOP fib(n)
+  CHAT IS THIS REAL n < 2 THEN ITS GIVING n
+  ITS GIVING fib(n - 1) + fib(n - 2)
+BOMBOCLATT
+fib(15) + total
+'''
+
+def bench_executor(jobs=32, workers=(1, 2, 4, 8)):
+    print(f'executor: {jobs} CPU-bound scripts')
+    scripts = [(f'<job {i}>', EXECUTOR_SCRIPT) for i in range(jobs)]
+
+    for kind in ('thread', 'process'):
+        for count in workers:
+            with basic.Executor(count, kind) as executor:
+                executor.map(scripts[:count])
+                seconds = timed(lambda: executor.map(scripts), repeat=1)
+            print(f'  {kind:<8} {count} workers {seconds:.3f}s {jobs / seconds:.1f} scripts/s')
+
+LIST_PATTERNS = {
+    'l = l + i': 'PLUH l = []\nMEWING i = 0 TO {n} THEN PLUH l = l + i\nLEN(l)',
+    'APPEND(l, i)': 'PLUH l = []\nMEWING i = 0 TO {n} THEN APPEND(l, i)\nLEN(l)',
+    'l = l * [i]': 'PLUH l = []\nMEWING i = 0 TO {n} THEN PLUH l = l * [i]\nLEN(l)',
+}
+
+def bench_lists(sizes=(25000, 50000, 100000)):
+    print('lists: time per element should stay flat as the list grows')
+
+    for name, pattern in LIST_PATTERNS.items():
+        for n in sizes:
+            text = pattern.format(n=n)
+            def build():
+                context = basic.Context('<bench>')
+                context.symbol_table = basic.new_global_scope()
+                basic.run('<bench>', text, context)
+            seconds = timed(build)
+            print(f'  {name:<14} {n:>7} {seconds:.3f}s {seconds / n * 1e6:.2f}us/element')
+
+VECTOR_PATTERNS = {
+    'loop': 'PLUH total = 0\nMEWING i = 0 TO {n} THEN PLUH total = total + (i + 1) * 2\ntotal',
+    'vector': 'SUM(MAP_ADD(RANGE(0, {n}), 1)) * 2',
+}
+
+def bench_vectors(n=1000000):
+    print(f'vectors: summing and scaling {n} numbers ({"numpy" if basic.USE_NUMPY else "array"})')
+
+    for name, pattern in VECTOR_PATTERNS.items():
+        text = pattern.format(n=n)
+        seconds = timed(lambda: basic.run('<bench>', text))
+        print(f'  {name:<8} {seconds:.3f}s')
+
+LOOP_SCRIPT = '''
+BOP work(n)
+  PLUH total = 0
+  MEWING i = 0 TO n THEN PLUH total = total + i
+  ITS GIVING total
+BOMBOCLATT
+work({n})
+'''
+
+def bench_loops(n=1000000):
+    print(f'loops: {n} iterations of a numeric FOR loop')
+    text = LOOP_SCRIPT.format(n=n)
+
+    for engine in ('interpreter', 'compiler', 'vm'):
+        seconds = timed(lambda: basic.run('<bench>', text, engine=engine))
+        print(f'  {engine:<12} {seconds:.3f}s {seconds / n * 1e9:.0f}ns/iteration')
+
+ITERATION_PATTERNS = {
+    'index': 'PLUH total = 0\nMEWING i = 0 TO LEN(l) THEN PLUH total = total + l / i\ntotal',
+    'for-each': 'PLUH total = 0\nMEWING x IN l THEN PLUH total = total + x\ntotal',
+    'range': 'PLUH total = 0\nMEWING x IN RANGE(0, {n}) THEN PLUH total = total + x\ntotal',
+}
+
+def bench_iteration(n=1000000):
+    print(f'iteration: summing {n} list elements')
+    numbers = basic.List([basic.Number.of(i) for i in range(n)])
+
+    for name, pattern in ITERATION_PATTERNS.items():
+        text = pattern.format(n=n)
+        def iterate():
+            context = basic.Context('<bench>')
+            context.symbol_table = basic.new_global_scope()
+            context.symbol_table.set('l', numbers)
+            basic.run('<bench>', text, context)
+        seconds = timed(iterate)
+        print(f'  {name:<10} {seconds:.3f}s {seconds / n * 1e9:.0f}ns/element')
+
+BENCHMARKS = {
+    'lexer': bench_lexer,
+    'parser': bench_parser,
+    'executor': bench_executor,
+    'lists': bench_lists,
+    'vectors': bench_vectors,
+    'loops': bench_loops,
+    'iteration': bench_iteration,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
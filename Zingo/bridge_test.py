@@ -1,5 +1,5 @@
 import basic
-from basic import String, Context, global_symbol_table
+from basic import String, Context, new_global_scope
 
 user_input = input("Enter something: ")
 
@@ -7,7 +7,7 @@ with open("example.zingo", "r") as f:
     zingo_code = f.read()
 
 context = Context('<bridge_test>')
-context.symbol_table = global_symbol_table
+context.symbol_table = new_global_scope()
 
 context.symbol_table.set("input_value", String(user_input))
 
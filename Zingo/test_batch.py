@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+import basic
+import batch
+
+SCRIPTS = {
+    'a.zingo': 'TYPESHI("a")\n1 + 1',
+    'b.zingo': 'PLUH x = 1 / 0',
+    'nested/c.zingo': 'MEWING i = 0 TO 3 THEN TYPESHI(i)',
+    'nested/deeper/d.zingo': 'PLUH x = (',
+    'nested/notes.txt': 'not a script',
+}
+
+# A directory of scripts, with the program cache in a private directory of
+# its own
+class ScriptDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = tempfile.TemporaryDirectory()
+        self.previous_cache_dir = os.environ.get('ZINGO_CACHE_DIR')
+        os.environ['ZINGO_CACHE_DIR'] = os.path.join(self.cache.name, 'zingo')
+
+        for name, text in SCRIPTS.items():
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(text)
+
+    def tearDown(self):
+        if self.previous_cache_dir is None:
+            del os.environ['ZINGO_CACHE_DIR']
+        else:
+            os.environ['ZINGO_CACHE_DIR'] = self.previous_cache_dir
+        self.directory.cleanup()
+        self.cache.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+class BatchTest(ScriptDirectoryTest):
+    def test_find_scripts_walks_nested_directories(self):
+        self.assertEqual(batch.find_scripts(self.directory.name), [
+            self.path('a.zingo'),
+            self.path('b.zingo'),
+            self.path('nested/c.zingo'),
+            self.path('nested/deeper/d.zingo'),
+        ])
+
+    def test_run_batch_on_nested_directory(self):
+        for engine in ('interpreter', 'compiler', 'vm'):
+            with self.subTest(engine=engine):
+                results = batch.run_batch(batch.find_scripts(self.directory.name), engine=engine)
+                by_name = {os.path.relpath(result['file'], self.directory.name): result for result in results}
+
+                self.assertEqual(by_name['a.zingo']['output'], ['a'])
+                self.assertEqual(by_name['a.zingo']['value'], '[0, 2]')
+                self.assertIn('Division by zero', by_name['b.zingo']['error'])
+                self.assertEqual(by_name['nested/c.zingo']['output'], ['0', '1', '2'])
+                self.assertIn('Invalid Syntax', by_name['nested/deeper/d.zingo']['error'])
+
+    def test_budget_stops_a_script(self):
+        with open(self.path('nested/loop.zingo'), 'w') as f:
+            f.write('LET HIM COOK 1 THEN PLUH x = 1')
+        results = batch.run_batch([self.path('nested/loop.zingo')], budget=basic.Budget(max_steps=1000))
+        self.assertIn('Step budget of 1000 exceeded', results[0]['error'])
+
+    def test_main_prints_one_result_per_script(self):
+        self.assertEqual(batch.main([self.directory.name, '-j', '1']), 1)
+
+class DiskCacheTest(ScriptDirectoryTest):
+    def test_cache_entries_stay_out_of_the_script_directory(self):
+        node, error = basic.load_program(self.path('a.zingo'))
+        self.assertIsNone(error)
+
+        cache_dir = basic.cache_dir()
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['a.zingo', 'b.zingo', 'nested'])
+
+    def test_cached_program_is_reused_until_the_script_changes(self):
+        basic.load_program(self.path('a.zingo'))
+        self.assertIsNotNone(basic.read_cache_entry(self.path('a.zingo')))
+        self.assertEqual(basic.run_file_isolated(self.path('a.zingo')).value, '[0, 2]')
+
+        with open(self.path('a.zingo'), 'w') as f:
+            f.write('3 * 3')
+        self.assertEqual(basic.run_file_isolated(self.path('a.zingo')).value, '[9]')
+
+    def test_cache_directory_others_can_write_is_ignored(self):
+        basic.load_program(self.path('a.zingo'))
+        os.chmod(basic.cache_dir(), 0o777)
+        self.assertIsNone(basic.read_cache_entry(self.path('a.zingo')))
+
+class ExecutorTest(unittest.TestCase):
+    def test_thread_executor(self):
+        scripts = [(f'<{i}>', f'PLUH x = {i}\nTYPESHI(x * 2)') for i in range(8)]
+        with basic.Executor(4) as executor:
+            results = executor.map(scripts)
+        self.assertEqual([result.output for result in results], [[str(i * 2)] for i in range(8)])
+
+    def test_map_passes_variables(self):
+        scripts = [('<plain>', '1 + 1'), ('<with variables>', 'name + "!"', {'name': 'hi'})]
+        with basic.Executor(2, engine='compiler') as executor:
+            results = executor.map(scripts)
+        self.assertEqual([(result.value, result.error) for result in results], [('[2]', None), ('["hi!"]', None)])
+
+    def test_process_executor(self):
+        with basic.Executor(2, kind='process', engine='vm') as executor:
+            result = executor.submit('<p>', 'n * 2', {'n': 21}).result()
+        self.assertEqual((result.value, result.error), ('[42]', None))
+
+if __name__ == '__main__':
+    unittest.main()
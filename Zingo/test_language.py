@@ -0,0 +1,281 @@
+import threading
+import unittest
+
+import basic
+
+ENGINES = ('interpreter', 'compiler', 'vm')
+
+# Runs text under every engine, checks that they agree and returns the
+# RunResult of the first
+class EngineTestCase(unittest.TestCase):
+    def run_all(self, text, **options):
+        results = []
+        for engine in ENGINES:
+            result = basic.run_isolated('<test>', text, engine=engine, **options)
+            results.append(result)
+            with self.subTest(engine=engine):
+                self.assertEqual(
+                    (result.value, result.error, result.output),
+                    (results[0].value, results[0].error, results[0].output)
+                )
+        return results[0]
+
+    def assertValue(self, text, expected, **options):
+        result = self.run_all(text, **options)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.value, expected)
+
+    def assertError(self, text, message, **options):
+        result = self.run_all(text, **options)
+        self.assertIsNone(result.value)
+        self.assertIn(message, result.error)
+
+class ListTest(EngineTestCase):
+    def test_operators_leave_the_operand_alone(self):
+        self.assertValue(
+            'PLUH a = [1, 2]\nPLUH b = a + 3\nPLUH c = a * [9]\nPLUH d = b - 0\n[a, b, c, d]',
+            '[[1, 2], [1, 2, 3], [1, 2, 9], [2, 3], [[1, 2], [1, 2, 3], [1, 2, 9], [2, 3]]]'
+        )
+
+    def test_results_of_the_same_list_do_not_share_appends(self):
+        self.assertValue(
+            'PLUH a = [1]\nPLUH b = a + 2\nPLUH c = a + 3\nAPPEND(b, 4)\n[a, b, c]',
+            '[[1], [1, 2, 4], [1, 3], 0, [[1], [1, 2, 4], [1, 3]]]'
+        )
+
+    def test_append_changes_every_name_for_the_list(self):
+        self.assertValue(
+            'PLUH a = [1]\nPLUH b = a\nAPPEND(b, 2)\n[a, b]',
+            '[[1, 2], [1, 2], 0, [[1, 2], [1, 2]]]'
+        )
+
+    def test_append_in_a_loop(self):
+        self.assertValue(
+            'BOP build()\n'
+            '  PLUH a = []\n'
+            '  MEWING i = 0 TO 1000 THEN APPEND(a, i)\n'
+            '  ITS GIVING [LEN(a), a / 999]\n'
+            'BOMBOCLATT\n'
+            'build()',
+            '[<function build>, [1000, 999]]'
+        )
+
+    def test_index_out_of_bounds(self):
+        self.assertError('[1, 2] / 2', 'index is out of bounds')
+
+class ForEachTest(EngineTestCase):
+    def test_list(self):
+        self.assertValue(
+            'PLUH t = []\nMEWING x IN [1, "a", [2]] THEN APPEND(t, x)\nt',
+            '[[1, "a", [2]], [0, 0, 0], [1, "a", [2]]]'
+        )
+
+    def test_range(self):
+        self.assertValue(
+            'PLUH t = 0\nMEWING x IN RANGE(2, 6) THEN PLUH t = t + x\nt',
+            '[0, [2, 5, 9, 14], 14]'
+        )
+
+    def test_vector(self):
+        self.assertValue(
+            'PLUH t = []\nMEWING x IN VECTOR([1, 2.5]) THEN APPEND(t, x * 2)\nt',
+            '[[2.0, 5.0], [0, 0], [2.0, 5.0]]'
+        )
+
+    def test_string(self):
+        self.assertValue(
+            'PLUH t = []\nMEWING c IN "abc" THEN APPEND(t, c)\nt',
+            '[["a", "b", "c"], [0, 0, 0], ["a", "b", "c"]]'
+        )
+
+    def test_block_with_break_and_continue(self):
+        self.assertValue(
+            'PLUH t = []\n'
+            'MEWING x IN [1, 2, 3, 4, 5] THEN\n'
+            '  CHAT IS THIS REAL x == 2 THEN YES DADDY\n'
+            '  CHAT IS THIS REAL x == 4 THEN BRUH\n'
+            '  APPEND(t, x)\n'
+            'BOMBOCLATT\n'
+            't',
+            '[[1, 3], 0, [1, 3]]'
+        )
+
+    def test_loop_value(self):
+        self.assertValue('MEWING x IN [1, 2, 3] THEN x * 10', '[[10, 20, 30]]')
+
+    def test_not_iterable(self):
+        self.assertError('MEWING x IN 5 THEN x', 'Illegal operation')
+
+    def test_in_is_still_a_variable_name(self):
+        self.assertValue('PLUH IN = 3\nBOP f(IN) -> IN * 2\n[IN, f(IN)]', '[3, <function f>, [3, 6]]')
+        self.assertValue(
+            'PLUH IN = [1, 2]\nPLUH t = 0\nMEWING IN IN IN THEN PLUH t = t + IN\nt',
+            '[[1, 2], 0, [1, 3], 3]'
+        )
+
+    def test_syntax_errors(self):
+        self.assertError('MEWING x OUT [1] THEN 1', "Expected '=' or 'IN'")
+        self.assertError('MEWING x IN [1] x', "Expected 'THEN'")
+        self.assertError('MEWING x IN [1] THEN\n  x\n', "Expected 'BOMBOCLATT'")
+
+class ForStepTest(EngineTestCase):
+    def test_skibidi_step(self):
+        self.assertValue('MEWING i = 0 TO 10 SKIBIDI 3 THEN i', '[[0, 3, 6, 9]]')
+        self.assertValue('MEWING i = 5 TO 0 SKIBIDI -2 THEN i', '[[5, 3, 1]]')
+        self.assertValue('MEWING i = 0 TO 1 SKIBIDI 0.25 THEN i', '[[0, 0.25, 0.5, 0.75]]')
+
+    def test_step_is_an_expression(self):
+        self.assertValue('PLUH s = 2\nMEWING i = 0 TO 7 SKIBIDI s + 1 THEN i', '[2, [0, 3, 6]]')
+
+class RangeTest(EngineTestCase):
+    def test_huge_range_is_never_built(self):
+        self.assertValue(
+            'PLUH r = RANGE(0, 1000000000000)\n'
+            'PLUH n = 0\n'
+            'MEWING x IN r THEN\n'
+            '  CHAT IS THIS REAL x == 3 THEN BRUH\n'
+            '  PLUH n = n + 1\n'
+            'BOMBOCLATT\n'
+            '[n, r / 999999999999, r / -1, LEN(r)]',
+            '[RANGE(0, 1000000000000), 0, 0, [3, 999999999999, 999999999999, 1000000000000]]'
+        )
+
+    def test_vector_builtins_accept_ranges(self):
+        self.assertValue('SUM(RANGE(0, 101))', '[5050.0]')
+
+    def test_index_out_of_bounds(self):
+        self.assertError('RANGE(0, 3) / 3', 'index is out of bounds')
+
+    def test_arguments_must_be_numbers(self):
+        self.assertError('RANGE("a", 3)', 'Arguments must be numbers')
+
+class ScopeTest(EngineTestCase):
+    def test_functions_see_their_callers_variables(self):
+        self.assertValue(
+            'PLUH x = "global"\n'
+            'BOP show() -> x\n'
+            'BOP outer()\n'
+            '  PLUH x = "outer local"\n'
+            '  ITS GIVING show()\n'
+            'BOMBOCLATT\n'
+            '[show(), outer(), show()]',
+            '["global", <function show>, <function outer>, ["global", "outer local", "global"]]'
+        )
+
+    def test_arguments_shadow_globals_set_later(self):
+        self.assertValue(
+            'BOP g() -> y\nBOP h(y) -> g()\nPLUH y = 1\n[g(), h(2), g()]',
+            '[<function g>, <function h>, 1, [1, 2, 1]]'
+        )
+
+    def test_rebinding_a_builtin(self):
+        self.assertValue(
+            'BOP f() -> TYPESHI\nPLUH a = f()\nPLUH TYPESHI = 5\nPLUH b = f()\n[IS_FUN(a), b, MATH_PI > 3]',
+            '[<function f>, <built-in function print>, 5, 5, [1, 5, 1]]'
+        )
+
+    def test_locals_do_not_leak(self):
+        self.assertError('BOP f()\n  PLUH local = 1\nBOMBOCLATT\nf()\nlocal', "'local' is not defined")
+
+    def test_recursion_keeps_locals_apart(self):
+        self.assertValue(
+            'BOP fib(n)\n'
+            '  CHAT IS THIS REAL n < 2 THEN ITS GIVING n\n'
+            '  PLUH a = fib(n - 1)\n'
+            '  PLUH b = fib(n - 2)\n'
+            '  ITS GIVING a + b\n'
+            'BOMBOCLATT\n'
+            'fib(15)',
+            '[<function fib>, 610]'
+        )
+
+    def test_shadowing_state_belongs_to_one_global_scope(self):
+        shadowing = basic.new_global_scope()
+        context = basic.Context('<program>')
+        context.symbol_table = shadowing
+        basic.run('<shadowing>', 'BOP f(x) -> x\nf(1)', context, engine='compiler')
+        self.assertIn('x', shadowing.bound_names)
+        self.assertNotIn('x', basic.new_global_scope().bound_names)
+
+    def test_global_scope_keeps_values_between_runs(self):
+        context = basic.Context('<shell>')
+        context.symbol_table = basic.new_global_scope()
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                basic.run('<a>', 'PLUH q = 10', context, engine=engine)
+                self.assertEqual(basic.run('<b>', 'BOP k() -> q\nk() + 1', context, engine=engine)[0].elements[1].value, 11)
+                context.symbol_table.remove('q')
+                self.assertIsNone(context.symbol_table.get('q'))
+
+class BudgetTest(EngineTestCase):
+    def test_step_budget(self):
+        self.assertError('LET HIM COOK 1 THEN PLUH x = 1', 'Step budget of 1000 exceeded', budget=basic.Budget(max_steps=1000))
+
+    def test_time_budget(self):
+        self.assertError('LET HIM COOK 1 THEN PLUH x = 1', 'Time budget of 0.05s exceeded', budget=basic.Budget(max_seconds=0.05))
+
+    def test_call_depth_limit(self):
+        self.assertError('BOP f(n) -> f(n + 1)\nf(0)', 'Call depth limit of 50 exceeded', budget=basic.Budget(max_depth=50))
+        self.assertValue(
+            'BOP f(n) -> CHAT IS THIS REAL n THEN f(n - 1) W CHAT "done"\nf(49)',
+            '[<function f>, "done"]',
+            budget=basic.Budget(max_depth=50)
+        )
+
+    def test_runaway_recursion_without_a_budget(self):
+        self.assertError('BOP f(n) -> f(n + 1)\nf(0)', 'Maximum recursion depth exceeded')
+
+    def test_budget_is_fresh_for_every_run(self):
+        budget = basic.Budget(max_steps=100)
+        for _ in range(3):
+            self.assertValue('MEWING i = 0 TO 60 THEN\n  PLUH x = i\nBOMBOCLATT\nx', '[0, 59]', budget=budget)
+
+    def test_cancel_from_another_thread(self):
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                meter = basic.Budget().start()
+                threading.Timer(0.05, meter.cancel).start()
+                result = basic.run_isolated('<cancel>', 'LET HIM COOK 1 THEN PLUH x = 1', engine=engine, budget=meter)
+                self.assertIn('Script was cancelled', result.error)
+
+LEXER_PROGRAMS = [
+    'CHAT  IS\tTHIS REAL x THEN TYPESHI("yes") YO CHAT y THEN 1 W CHAT 2',
+    'LET HIM COOK i < 10 THEN PLUH i = i + 1',
+    'BOP add(a, b) -> a + b\nITS GIVING add(1.5, 2)',
+    'PLUH s = "tab\\tquote\\" newline\\n"',
+    '[a, b] <= != == >= < > ^ / * - +',
+    'CHAT IS THIS x',
+    'PLUH x = 1 @',
+    'x ! y',
+    '"unterminated',
+]
+
+class LexerTest(unittest.TestCase):
+    def tokens(self, lexer_class, text):
+        tokens, error = lexer_class('<lexer>', text).make_tokens()
+        if error:
+            return None, (error.error_name, error.details, error.pos_start.idx, error.pos_end.idx)
+        return [(tok.type, tok.value, tok.pos_start.idx, tok.pos_end.idx) for tok in tokens], None
+
+    def test_regex_lexer_matches_character_lexer(self):
+        for text in LEXER_PROGRAMS:
+            with self.subTest(text=text):
+                self.assertEqual(self.tokens(basic.RegexLexer, text), self.tokens(basic.Lexer, text))
+
+    def test_multi_word_keywords(self):
+        tokens, _ = self.tokens(basic.RegexLexer, 'CHAT  IS\tTHIS REAL x THEN YES DADDY')
+        self.assertEqual(
+            [(tok_type, value) for tok_type, value, _, _ in tokens],
+            [('KEYWORD', 'CHAT IS THIS REAL'), ('IDENTIFIER', 'x'), ('KEYWORD', 'THEN'), ('KEYWORD', 'YES DADDY'), ('EOF', None)]
+        )
+
+    def test_keyword_prefix_is_an_identifier(self):
+        tokens, _ = self.tokens(basic.RegexLexer, 'CHAT IS')
+        self.assertEqual([tok[:2] for tok in tokens], [('IDENTIFIER', 'CHAT'), ('IDENTIFIER', 'IS'), ('EOF', None)])
+
+    def test_errors(self):
+        self.assertEqual(self.tokens(basic.RegexLexer, 'PLUH x = 1 @')[1], ('Illegal Character', "'@'", 11, 12))
+        self.assertEqual(self.tokens(basic.RegexLexer, 'x ! y')[1], ('Expected Character', "'=' (after '!')", 2, 4))
+
+if __name__ == '__main__':
+    unittest.main()
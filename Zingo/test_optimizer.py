@@ -0,0 +1,137 @@
+import hashlib
+import pickle
+import unittest
+
+import basic
+
+ENGINES = ('interpreter', 'compiler', 'vm')
+
+PROGRAMS = {
+    'arithmetic': '''
+PLUH a = 1 + 2 * 3 - 4 / 2
+PLUH b = -(2 + 3) * 2
+PLUH c = (1 < 2) AND (3 >= 3) OR CAP 0
+TYPESHI(a)
+TYPESHI(b)
+TYPESHI(c)
+[a, b, c, 2 ^ 10]
+''',
+    'division by zero': '''
+PLUH x = 1
+TYPESHI(x)
+PLUH y = (2 + 3) / (4 - 4)
+TYPESHI(y)
+''',
+    'dead code after return': '''
+BOP f(n)
+  ITS GIVING n * 2
+  TYPESHI("unreachable")
+  PLUH n = 1 / 0
+BOMBOCLATT
+TYPESHI(f(21))
+''',
+    'dead code after break and continue': '''
+PLUH seen = []
+MEWING i = 0 TO 5 THEN
+  CHAT IS THIS REAL i == 1 THEN
+    YES DADDY
+    APPEND(seen, "skipped")
+  BOMBOCLATT
+  CHAT IS THIS REAL i == 3 THEN
+    BRUH
+    APPEND(seen, "skipped")
+  BOMBOCLATT
+  APPEND(seen, i)
+BOMBOCLATT
+seen
+''',
+    'constant if': '''
+CHAT IS THIS REAL 1 == 1 THEN TYPESHI("first") W CHAT TYPESHI("never")
+CHAT IS THIS REAL 0 THEN TYPESHI("never") YO CHAT 2 > 1 THEN TYPESHI("second") W CHAT TYPESHI("never")
+CHAT IS THIS REAL 0 THEN TYPESHI("never")
+PLUH x = CHAT IS THIS REAL 1 THEN "folded" W CHAT "never"
+CHAT IS THIS REAL 1 THEN
+  TYPESHI("block")
+BOMBOCLATT
+x
+''',
+    'constant if with error': '''
+CHAT IS THIS REAL 1 THEN TYPESHI(1 / 0) W CHAT TYPESHI("never")
+''',
+    'string folding': '''
+PLUH s = "ab" + "cd"
+PLUH t = "xy" * 3
+PLUH u = "z" * 5000
+TYPESHI(s)
+TYPESHI(t)
+[s, t, LEN([u])]
+''',
+    'string folding errors': '''
+PLUH s = "ab" - "b"
+''',
+    'huge string in dead code': '''
+BOP f()
+  ITS GIVING "ab" * 200000000
+BOMBOCLATT
+"ok"
+''',
+    'loops and functions': '''
+BOP add(a, b) -> a + b
+PLUH total = 0
+MEWING i = 0 TO 2 + 3 THEN PLUH total = total + add(i, 1 * 2)
+MEWING x IN [1 + 1, 2 * 2] THEN PLUH total = total + x
+PLUH n = 0
+LET HIM COOK n < 3 - 0 THEN PLUH n = n + 1
+[total, n]
+''',
+}
+
+class OptimizerTest(unittest.TestCase):
+    def run_program(self, name, text, engine, optimize):
+        result = basic.run_isolated(f'<{name}>', text, engine=engine, optimize=optimize)
+        return result.value, result.error, result.output
+
+    def test_optimized_output_matches(self):
+        for name, text in PROGRAMS.items():
+            for engine in ENGINES:
+                with self.subTest(program=name, engine=engine):
+                    expected = self.run_program(name, text, engine, False)
+                    self.assertEqual(self.run_program(name, text, engine, True), expected)
+
+    def test_cached_tree_is_not_changed(self):
+        text = PROGRAMS['arithmetic']
+        node, error = basic.parse('<cached>', text)
+        self.assertIsNone(error)
+        values = [statement.value_node for statement in node.element_nodes[:3]]
+
+        optimized = basic.Optimizer().optimize(node)
+        self.assertIsNot(optimized, node)
+        for statement, value_node in zip(node.element_nodes, values):
+            self.assertIs(statement.value_node, value_node)
+            self.assertNotIsInstance(value_node, basic.NumberNode)
+
+    def test_cached_program_is_not_changed_by_runs(self):
+        text = PROGRAMS['loops and functions'] + PROGRAMS['constant if']
+        self.run_program('shared', text, 'interpreter', False)
+        key = ('<shared>', hashlib.blake2b(text.encode(), digest_size=16).digest())
+        node = basic.program_cache.get(key)
+        self.assertIsNotNone(node)
+        before = pickle.dumps(node)
+
+        for engine in ENGINES:
+            for optimize in (True, False):
+                with self.subTest(engine=engine, optimize=optimize):
+                    self.run_program('shared', text, engine, optimize)
+                    self.assertIs(basic.program_cache.get(key), node)
+                    self.assertEqual(pickle.dumps(node), before)
+
+    def test_optimize_then_plain_run(self):
+        text = 'PLUH x = 1 + 2\nx'
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                optimized = self.run_program('shared', text, engine, True)
+                plain = self.run_program('shared', text, engine, False)
+                self.assertEqual(optimized, plain)
+
+if __name__ == '__main__':
+    unittest.main()